@@ -3,6 +3,7 @@ from pathlib import Path
 # --- Útvonalak ---
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
+CACHE_DIR = DATA_DIR / "cache"
 FIGURES_DIR = BASE_DIR / "figures"
 REPORTS_DIR = BASE_DIR / "reports"
 
@@ -21,7 +22,52 @@ FILES = {
     "ccyb_processed": DATA_DIR / "processed_ccyb.parquet",
     "latest_ccyb": DATA_DIR / "latest_ccyb.parquet",
     "bbm_processed": DATA_DIR / "processed_bbm.parquet",
-    "latest_bbm": DATA_DIR / "latest_bbm.parquet"
+    "latest_bbm": DATA_DIR / "latest_bbm.parquet",
+    "ccyb_decisions": DATA_DIR / "ccyb_decisions.parquet",
+    "syrb_decisions": DATA_DIR / "syrb_decisions.parquet",
+    "active_syrb": DATA_DIR / "active_syrb.parquet",
+    "bbm_decisions": DATA_DIR / "bbm_decisions.parquet",
+    "views_manifest": DATA_DIR / "views_manifest.json",
+    "ledger": DATA_DIR / "measure_ledger.parquet",
+    "panel": DATA_DIR / "panel",
+    "releases": DATA_DIR / "releases",
+    "report_cache": DATA_DIR / "report_cache.json",
+    "llm_cache": DATA_DIR / "llm_cache.sqlite",
+    "etl_manifest": DATA_DIR / "etl_manifest.json",
+    "country_codes": DATA_DIR / "country_codes.json"
+}
+
+# --- Országkódok ---
+# ESRB-specifikus elnevezések, amelyeket nem a country_converter-rel oldunk fel
+COUNTRY_OVERRIDES = {
+    "Czech Republic": {"iso2": "CZ", "iso3": "CZE"},
+    "Slovak Republic": {"iso2": "SK", "iso3": "SVK"},
+    "European Union": {"iso2": "EU", "iso3": "EUU"},
+    "Euro area": {"iso2": "EA", "iso3": "EMU"},
+}
+
+# --- Országcsoportok ---
+# Euroövezeti tagság (ISO2 -> csatlakozás napja); a diffúziós bontás időpontonként ez alapján sorol
+EURO_AREA = {
+    **dict.fromkeys(["AT", "BE", "DE", "ES", "FI", "FR", "IE", "IT", "LU", "NL", "PT"], "1999-01-01"),
+    "GR": "2001-01-01", "SI": "2007-01-01", "CY": "2008-01-01", "MT": "2008-01-01", "SK": "2009-01-01",
+    "EE": "2011-01-01", "LV": "2014-01-01", "LT": "2015-01-01", "HR": "2023-01-01", "BG": "2026-01-01",
+}
+
+# --- ETL ---
+ETL_CONFIG = {
+    # "auto": calamine, ha telepítve van, különben openpyxl
+    "excel_engine": "auto",
+    # Csak az új/módosult sorokat dolgozzuk fel újra (sor-ujjlenyomatok a processed_*.rows.parquet-ben)
+    "incremental": True,
+    # >1: a három adathalmaz (CCyB, SyRB, BBM) feldolgozása párhuzamos folyamatokban
+    "workers": 1,
+}
+
+# --- Riport ---
+REPORT_CONFIG = {
+    # Csak a változott adatoktól függő LLM elemzések, PNG exportok és letöltések készülnek újra (report_cache.IMPACT_MAP)
+    "incremental": True,
 }
 
 # --- LLM ---
@@ -29,6 +75,21 @@ LLM_CONFIG = {
     "model_name": "gemini-2.5-flash-lite",
     "max_output_tokens": 2000,
     "api_key_env": "GOOGLE_API_KEY",
+    # Párhuzamos ábra-elemzések (ainvoke) felső korlátja és hívásonkénti időkorlát (mp)
+    "concurrency": 4,
+    "timeout": 120,
+}
+
+# Perzisztens LLM válasz-cache (llm_cache.LLMCache): kulcs = modell, temperature, prompt, kép-hash-ek
+LLM_CACHE_CONFIG = {
+    "enabled": True,
+    # bypass: friss hívások (a válaszok ettől még tárolódnak); env: LLM_CACHE_BYPASS=1
+    "bypass": False,
+    "bypass_env": "LLM_CACHE_BYPASS",
+    "ttl_days": 30,
+    # LRU törlés, ha a bejegyzések száma vagy összmérete túllépi a korlátot
+    "max_entries": 5000,
+    "max_mb": 200,
 }
 
 # --- Google Search (Grounded Validation) ---
@@ -0,0 +1,70 @@
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+
+class CountryResolver:
+    """
+    Országnév -> ISO kód feloldás memoizálva. Csak az egyedi neveket konvertáljuk, az eredményt
+    egy kis JSON fájlban tároljuk (név -> {iso2, iso3}), és kategórián keresztül képezzük vissza
+    a sorokra. A country_converter csak akkor töltődik be, ha új (még nem látott) név jelenik meg.
+    A nem felismert neveket a country_converter not_found=None viselkedéséhez igazodva változatlanul adjuk vissza.
+    """
+
+    def __init__(self, cache_path: Optional[Path] = None, overrides: Optional[Dict[str, Dict[str, str]]] = None):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.overrides = overrides or {}
+        self._mapping: Dict[str, Dict[str, str]] = read_json(self.cache_path) if self.cache_path else {}
+        self._dirty = False
+
+    def _lookup(self, name: str, to: str):
+        override = self.overrides.get(name)
+        if override and to in override:
+            return override[to]
+        return self._mapping.get(name, {}).get(to)
+
+    def _resolve_missing(self, names: Iterable[str], to: str):
+        missing = [n for n in names if self._lookup(n, to) is None]
+        if not missing: return
+        logger.info(f"  Resolving {len(missing)} new country name(s) to {to}...")
+        import country_converter as coco
+        logging.getLogger("country_converter").setLevel(logging.ERROR)
+        codes = coco.convert(names=missing, to=to, not_found=None)
+        if len(missing) == 1: codes = [codes]
+        for name, code in zip(missing, codes):
+            self._mapping.setdefault(name, {})[to] = code
+        self._dirty = True
+
+    def convert(self, names, to: str = "iso2") -> pd.Series:
+        names = pd.Series(names)
+        cat = names.astype(str).where(names.notna()).astype("category")
+        categories = list(cat.cat.categories)
+        self._resolve_missing(categories, to)
+        lookup = np.array([self._lookup(n, to) for n in categories] + [None], dtype=object)
+        # A -1 (hiányzó név) kód az utolsó, None elemre mutat
+        return pd.Series(lookup[cat.cat.codes.to_numpy()], index=names.index)
+
+    @property
+    def mapping(self) -> Dict[str, Dict[str, str]]:
+        return self._mapping
+
+    def merge(self, mapping: Dict[str, Dict[str, str]]):
+        """Egy másik resolver (pl. párhuzamos worker) által feloldott nevek átvétele."""
+        for name, codes in mapping.items():
+            known = self._mapping.setdefault(name, {})
+            for to, code in codes.items():
+                if known.get(to) != code:
+                    known[to] = code
+                    self._dirty = True
+
+    def save(self):
+        if self.cache_path and self._dirty:
+            write_json(self.cache_path, dict(sorted(self._mapping.items())))
+            self._dirty = False
@@ -1,50 +1,218 @@
+import hashlib
+import json
+import numpy as np
 import pandas as pd
-import country_converter as coco
 import logging
 import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from utils import clean_columns, find_header_row, extract_rate, ensure_dirs, download_file_safely
-from config import FILES
+from utils import extract_rates, download_file_safely, file_sha256, read_json, write_json
+from config import FILES, CACHE_DIR, ETL_CONFIG, COUNTRY_OVERRIDES
+from countries import CountryResolver
+from workbook import WorkbookReader
+from schema import apply_schema, enable_copy_on_write
+from step_series import StepSeries
+from state_index import StateIndex
+from panel import PolicyPanel, write_panel
+from releases import ReleaseArchive
+from ledger import build_ledger, diffusion, diffusion_breakdowns, latest_state, change_log
 
 logger = logging.getLogger(__name__)
 
+# Növeld, ha a feldolgozási logika változik: érvényteleníti a korábbi processed_* kimeneteket
+ETL_VERSION = 1
+PROCESSED_KEYS = {'syrb_df': 'syrb_processed', 'ccyb_df': 'ccyb_processed', 'bbm_df': 'bbm_processed'}
+# Adathalmaz -> trend_series kulcs, a calculate_trends visszatérési sorrendjében (agg/CCyB, SyRB, BBM)
+TREND_KEYS = {'ccyb_df': 'ccyb', 'syrb_df': 'syrb', 'bbm_df': 'bbm'}
+# A diffúziós trend oszlopnevei eszközönként (altípusonkénti számlálásnál altípus -> oszlop)
+TREND_COLUMNS = {'ccyb': 'n_positive', 'syrb': {'General': 'General SyRB', 'Sectoral': 'Sectoral SyRB'}, 'bbm': 'n_countries'}
+
+# SyRB kitettség-kategóriák (a sorrend a besorolási prioritás is)
+SYRB_EXPOSURE_CATEGORIES = ["General", "Real Estate (CRE & RRE)", "Commercial Real Estate (CRE)", "Residential Real Estate (RRE)", "Other"]
+SYRB_TYPES = ["General", "Sectoral"]
+_GENERAL_EXPOSURE = re.compile(r'all exposures|domestic')
+_CRE_TERMS = re.compile(r'commercial|cre')
+_RRE_TERMS = re.compile(r'residential|rre|housing')
+_RRE_BROAD_TERMS = re.compile(r'residential|rre|housing|mortgage|household')
+
+
+def classify_syrb_exposures(df):
+    """Vektorizált SyRB besorolás: (exposure_type, syrb_type) kategória-oszlopok."""
+    def lowered(col):
+        return df[col].astype(str).str.lower() if col in df.columns else pd.Series('', index=df.index)
+    exp_type = lowered('exposure_type')
+    full_text = exp_type + " " + lowered('description')
+    is_cre = full_text.str.contains(_CRE_TERMS)
+    exposure = np.select(
+        [exp_type.str.contains(_GENERAL_EXPOSURE), is_cre & full_text.str.contains(_RRE_TERMS), is_cre,
+         full_text.str.contains(_RRE_BROAD_TERMS)],
+        SYRB_EXPOSURE_CATEGORIES[:4], default="Other",
+    )
+    syrb_type = np.where(exposure == "General", "General", "Sectoral")
+    return (pd.Categorical(exposure, categories=SYRB_EXPOSURE_CATEGORIES),
+            pd.Categorical(syrb_type, categories=SYRB_TYPES))
+
+def expand_syrb_trend_events(df):
+    """
+    Visszavonási események hozzáadása: minden revocation_date-tel rendelkező sor után egy
+    'Revoked', 0%-os másolat kerül a visszavonás dátumával. Az (ország, típus) csoport legutolsó,
+    'not active' státuszú és visszavonási dátum nélküli sora is 0%-os rátát kap.
+    """
+    if df.empty: return df
+    keys = ['country', 'syrb_type']
+    ordered = df.sort_values('date')
+    ordered = ordered.dropna(subset=keys).sort_values(keys + ['date'], kind='stable')
+    is_latest = ordered.groupby(keys, observed=True).cumcount(ascending=False).to_numpy() == 0
+    status = ordered['status'].astype(str) if 'status' in ordered.columns else pd.Series('', index=ordered.index)
+    revoked = ordered['revocation_date'].notna().to_numpy()
+
+    events = ordered.reset_index(drop=True)
+    inactive_latest = is_latest & status.str.lower().str.contains('not active', regex=False).to_numpy() & ~revoked
+    events.loc[inactive_latest, 'rate_numeric'] = 0.0
+
+    rev_events = ordered[revoked].reset_index(drop=True)
+    rev_events['date'] = rev_events['revocation_date']
+    rev_events['rate_numeric'] = 0.0
+    rev_events['status'] = 'Revoked'
+
+    # Minden visszavonási sor közvetlenül a forrássora után következik
+    order = np.concatenate([np.arange(len(events)) * 2, np.flatnonzero(revoked) * 2 + 1])
+    return pd.concat([events, rev_events], ignore_index=True).iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+
+def _hashable(df):
+    # A hiányzó érték Excelből NaN, Parquetből None: egységesen üres szövegként hash-eljük
+    return df.astype(object).where(df.notna(), "").astype(str)
+
+def row_fingerprints(df, salt=""):
+    """
+    Soronkénti 64 bites ujjlenyomat a (WorkbookReader által már normalizált) forrásoszlopokból.
+    Az oszlopnevek, az ETL_VERSION és a salt a hash kulcsába kerülnek, így ezek változása minden sort érvénytelenít.
+    """
+    key = hashlib.sha256(f"{ETL_VERSION}|{salt}|{'|'.join(map(str, df.columns))}".encode()).hexdigest()[:16]
+    return pd.util.hash_pandas_object(_hashable(df), index=False, hash_key=key)
+
+def latest_per_country(df):
+    """Országonként a legutolsó (legkésőbbi dátumú) sor."""
+    if df.empty: return df
+    return df.sort_values('date').groupby('country', observed=True).tail(1).reset_index(drop=True)
+
+def latest_decisions(df, columns, sort_by=('date',), n=10):
+    """A legfrissebb n döntés a megadott oszlopokkal (a dátumok formázása a riport feladata)."""
+    if df.empty: return pd.DataFrame()
+    top = df.sort_values(list(sort_by), ascending=False).head(n)
+    return top[[c for c in columns if c in top.columns]].reset_index(drop=True)
+
+def active_syrb_measures(df, today):
+    """Jelenleg aktív (vagy már bejelentett) SyRB intézkedések, országonként és kitettségenként a legutolsó, pozitív rátával."""
+    if df.empty: return pd.DataFrame()
+    status_str = df['status'].astype(str)
+    mask_active = (
+        status_str.str.contains('applicable|active', case=False, na=False) |
+        (df['date'] > today)
+    ) & (~status_str.str.contains('Deactivated|Revoked|No longer', case=False, na=False))
+    active = df[mask_active].sort_values('date', ascending=False).groupby(['iso2', 'exposure_type'], observed=True).head(1)
+    if 'rate_numeric' in active.columns:
+        active = active[active['rate_numeric'] > 0]
+    return active[[c for c in SYRB_VIEW_COLUMNS if c in active.columns]].reset_index(drop=True)
+
+def active_bbm_measures(df):
+    if df.empty: return pd.DataFrame()
+    return df[df['active_status'] == 'Active'].reset_index(drop=True)
+
+def frame_fingerprint(df):
+    """Egy teljes tábla tartalmi hash-e (oszlopnevekkel együtt) a nézetek érvényesítéséhez."""
+    digest = hashlib.sha256("|".join(map(str, df.columns)).encode())
+    if len(df): digest.update(pd.util.hash_pandas_object(_hashable(df), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+SYRB_VIEW_COLUMNS = ['date', 'iso2', 'syrb_type', 'exposure_type', 'rate_text', 'description']
+
+# Materializált nézetek: név -> (forrás adathalmaz, függ-e a mai naptól, számítás). A FILES[név] Parquetbe kerülnek.
+VIEWS = {
+    'latest_ccyb': ('ccyb_df', False, lambda df, today: latest_per_country(df)),
+    'latest_syrb': ('syrb_df', False, lambda df, today: latest_per_country(df)),
+    'latest_bbm': ('bbm_df', False, lambda df, today: active_bbm_measures(df)),
+    'ccyb_decisions': ('ccyb_df', False, lambda df, today: latest_decisions(
+        df, ['iso2', 'decision_date', 'date', 'rate', 'justification'], sort_by=('decision_date', 'date'))),
+    'syrb_decisions': ('syrb_df', False, lambda df, today: latest_decisions(df, SYRB_VIEW_COLUMNS)),
+    'active_syrb': ('syrb_df', True, active_syrb_measures),
+    'bbm_decisions': ('bbm_df', False, lambda df, today: latest_decisions(
+        df, ['date', 'iso2', 'measure_type', 'status', 'description'])),
+}
+# Növeld, ha valamelyik nézet definíciója változik
+VIEWS_VERSION = 1
+
+def _run_dataset(name, options, today, out_dir):
+    """Process pool worker: egy adathalmaz feldolgozása, az eredmény feather fájlokba kerül."""
+    enable_copy_on_write()
+    pipeline = ETLPipeline(**options, workers=1)
+    df = pipeline._dataset_reader(name).process()[name]
+    trend = pipeline.trend_frame(name, pipeline.dataset_trend(name, df, today))
+    df_path, trend_path = out_dir / f"{name}.feather", out_dir / f"{name}.trend.feather"
+    df.to_feather(df_path)
+    trend.to_feather(trend_path)
+    return df_path, trend_path, pipeline.countries.mapping
+
 class ETLPipeline:
-    def __init__(self, data_dir: Path, ccyb_url: str, syrb_url: str):
+    def __init__(self, data_dir: Path, ccyb_url: str, syrb_url: str, excel_engine: str = None, incremental: bool = None,
+                 workers: int = None):
         self.data_dir = data_dir
+        self.excel_engine = excel_engine or ETL_CONFIG.get("excel_engine", "auto")
+        self.incremental = ETL_CONFIG.get("incremental", True) if incremental is None else incremental
+        self.workers = workers or ETL_CONFIG.get("workers", 1)
         self.ccyb_url = ccyb_url
         self.syrb_url = syrb_url
         self.ccyb_file = FILES["ccyb_source"]
         self.syrb_file = FILES["syrb_source"]
+        self.countries = CountryResolver(FILES["country_codes"], COUNTRY_OVERRIDES)
+        self.releases = ReleaseArchive(FILES["releases"], row_fingerprints)
+
+    def _measures_reader(self, names=('syrb_df', 'bbm_df'), incremental=None):
+        # A SyRB és BBM lapok ugyanabban a munkafüzetben vannak: egy megnyitás, laponként egy parse
+        reader = WorkbookReader(self.syrb_file, cache_dir=CACHE_DIR, engine=self.excel_engine)
+        if 'syrb_df' in names:
+            reader.register('syrb_df', lambda s: "SRB" in s or "Systemic" in s,
+                            header_keywords=("reference of measure", "country"), header_rows=30,
+                            process=partial(self._process_syrb, incremental=incremental))
+        if 'bbm_df' in names:
+            reader.register('bbm_df', lambda s: "BoBM" in s, process=partial(self._process_bbm, incremental=incremental))
+        return reader
+
+    def _ccyb_reader(self, incremental=None):
+        return WorkbookReader(self.ccyb_file, cache_dir=CACHE_DIR, engine=self.excel_engine).register(
+            'ccyb_df', 0, process=partial(self._process_ccyb, incremental=incremental))
 
-    def _extract_rate_from_text(self, text):
-        if pd.isna(text): return 0.0
-        text = str(text).replace(',', '.')
-        matches = re.findall(r'(\d+(?:\.\d+)?)\s*%', text)
-        if not matches:
-            matches = re.findall(r'rate\s*(?:of|is)\s*(\d+(?:\.\d+)?)', text, re.IGNORECASE)
-        if matches:
-            rates = [float(r) for r in matches if float(r) <= 100.0]
-            return max(rates) if rates else 0.0
-        return 0.0
-
-    def _process_syrb(self):
-        if not self.syrb_file.exists(): return pd.DataFrame()
+    def _dataset_reader(self, name, incremental=None):
+        return self._ccyb_reader(incremental) if name == 'ccyb_df' else self._measures_reader((name,), incremental)
+
+    def _process_parallel(self, incremental=None):
+        """
+        Adathalmazonként külön folyamat (beolvasás + feldolgozás + trend). A táblák Arrow IPC (feather)
+        fájlokon keresztül jönnek vissza, a StepSeries-t a kompakt trend táblából építjük újra.
+        """
+        today = pd.Timestamp.now().normalize()
+        options = {'data_dir': self.data_dir, 'ccyb_url': self.ccyb_url, 'syrb_url': self.syrb_url,
+                   'excel_engine': self.excel_engine, 'incremental': self.incremental if incremental is None else incremental}
+        frames, self.trend_series = {}, {}
+        with tempfile.TemporaryDirectory(prefix="etl_") as tmp, \
+                ProcessPoolExecutor(max_workers=min(self.workers, len(PROCESSED_KEYS))) as pool:
+            futures = {name: pool.submit(_run_dataset, name, options, today, Path(tmp)) for name in PROCESSED_KEYS}
+            for name, future in futures.items():
+                df_path, trend_path, countries = future.result()
+                frames[name] = apply_schema(pd.read_feather(df_path))
+                self.countries.merge(countries)
+                trend = pd.read_feather(trend_path)
+                if not trend.empty:
+                    self.trend_series[TREND_KEYS[name]] = StepSeries.from_frame(trend, end=today)
+        trends = tuple(self.trend_frame(name, self.trend_series.get(key)) for name, key in TREND_KEYS.items())
+        return frames, trends
+
+    def _process_syrb(self, df=None, incremental=None):
+        if df is None: return self._measures_reader(incremental=incremental).process()['syrb_df']
+        if df.empty: return pd.DataFrame()
         try:
-            xl = pd.ExcelFile(self.syrb_file)
-            sheet = next((s for s in xl.sheet_names if "SRB" in s or "Systemic" in s), None)
-            if not sheet: return pd.DataFrame()
-
-            df_raw = xl.parse(sheet, header=None, nrows=30)
-            header_idx = 0
-            for i, row in df_raw.iterrows():
-                row_str = " ".join(row.astype(str)).lower()
-                if "reference of measure" in row_str or "country" in row_str:
-                    header_idx = i
-                    break
-            
-            df = xl.parse(sheet, skiprows=header_idx)
-            df = clean_columns(df)
-            
             col_map = {}
             for c in df.columns:
                 cl = c.lower().strip()
@@ -67,76 +235,26 @@ class ETLPipeline:
             df['revocation_date'] = pd.to_datetime(df.get('revocation_date'), errors='coerce')
             
             df = df.dropna(subset=['country'])
-            names = df['country'].tolist()
-            df['iso2'] = coco.convert(names=names, to='iso2', not_found=None)
-
-            # Rate kinyerés (alapértelmezett)
-            df['rate_numeric'] = df['description'].apply(self._extract_rate_from_text)
-            if 'rate_col' in df.columns:
-                numeric_col_rates = pd.to_numeric(df['rate_col'], errors='coerce')
-                df['rate_numeric'] = numeric_col_rates.fillna(df['rate_numeric'])
-
-            # Kategorizálás
-            def tag_exp(row):
-                exp_type = str(row.get('exposure_type', '')).lower()
-                desc = str(row.get('description', '')).lower()
-                full_text = exp_type + " " + desc
-                if 'all exposures' in exp_type: return "General"
-                if 'domestic' in exp_type: return "General"
-                if any(x in full_text for x in ['commercial', 'cre']):
-                    if any(x in full_text for x in ['residential', 'rre', 'housing']): return "Real Estate (CRE & RRE)"
-                    return "Commercial Real Estate (CRE)"
-                if any(x in full_text for x in ['residential', 'rre', 'housing', 'mortgage', 'household']): return "Residential Real Estate (RRE)"
-                return "Other"
-
-            df['exposure_type'] = df.apply(tag_exp, axis=1)
-            df['syrb_type'] = df['exposure_type'].apply(lambda x: 'General' if 'General' in x else 'Sectoral')
+            df = self._enrich('syrb_df', df, self._enrich_syrb, incremental)
 
             # --- Trend-specifikus feldolgozás: Duplikáljuk a sorokat a visszavonásokhoz ---
-            trend_events = []
-            for (country, sy_type), group in df.sort_values('date').groupby(['country', 'syrb_type']):
-                group = group.sort_values('date')
-                for i, (_, row) in enumerate(group.iterrows()):
-                    is_latest = (i == len(group) - 1)
-                    status = str(row.get('status', '')).lower()
-                    event = row.to_dict()
-                    if is_latest and 'not active' in status and pd.isna(row.get('revocation_date')):
-                        event['rate_numeric'] = 0.0
-                    trend_events.append(event)
-                    if not pd.isna(row.get('revocation_date')):
-                        rev_event = row.to_dict()
-                        rev_event['date'] = row['revocation_date']
-                        rev_event['rate_numeric'] = 0.0
-                        rev_event['status'] = 'Revoked'
-                        trend_events.append(rev_event)
-            
-            if trend_events:
-                df = pd.DataFrame(trend_events)
+            df = expand_syrb_trend_events(df)
             
             if 'status' in df.columns:
                 rev_mask = df['status'].astype(str).str.contains('Revoked', case=False, na=False)
                 df.loc[rev_mask, 'rate_numeric'] = 0.0
 
             df['rate_text'] = df['rate_numeric'].apply(lambda x: f"{x}%" if x > 0 else "0% / Inactive")
-            return df.sort_values(['country', 'date'], ascending=[True, False]).reset_index(drop=True)
+            return apply_schema(df.sort_values(['country', 'date'], ascending=[True, False]).reset_index(drop=True))
         except Exception as e:
             logger.error(f"SyRB Error: {e}")
             return pd.DataFrame()
 
-    def _process_bbm(self):
+    def _process_bbm(self, df=None, incremental=None):
         """Processes Borrower-Based Measures (LTV, DSTI, etc.) from the BoBM sheet."""
-        if not self.syrb_file.exists(): return pd.DataFrame()
+        if df is None: return self._measures_reader(incremental=incremental).process()['bbm_df']
+        if df.empty: return pd.DataFrame()
         try:
-            xl = pd.ExcelFile(self.syrb_file)
-            sheet = next((s for s in xl.sheet_names if "BoBM" in s), None)
-            if not sheet: return pd.DataFrame()
-
-            df_raw = xl.parse(sheet, header=None, nrows=30)
-            header_idx = find_header_row(df_raw)
-            
-            df = xl.parse(sheet, skiprows=header_idx)
-            df = clean_columns(df)
-            
             col_map = {}
             for c in df.columns:
                 cl = c.lower().strip()
@@ -154,31 +272,86 @@ class ETLPipeline:
             df['revocation_date'] = pd.to_datetime(df.get('revocation_date'), errors='coerce')
             
             df = df.dropna(subset=['country'])
-            df['iso2'] = coco.convert(names=df['country'].tolist(), to='iso2', not_found=None)
+            df = self._enrich('bbm_df', df, self._enrich_bbm, incremental)
             
-            # Határozzuk meg az aktív státuszt
-            def check_active(row):
-                status = str(row.get('status', '')).lower()
-                rev_date = row.get('revocation_date')
-                if 'deactivated' in status or 'revoked' in status or 'expired' in status:
-                    return "Inactive"
-                if pd.notna(rev_date) and rev_date <= pd.Timestamp.now():
-                    return "Inactive"
-                return "Active"
-
-            df['active_status'] = df.apply(check_active, axis=1)
+            df['active_status'] = self._bbm_active_status(df)
             
-            return df.sort_values(['country', 'date'], ascending=[True, False]).reset_index(drop=True)
+            return apply_schema(df.sort_values(['country', 'date'], ascending=[True, False]).reset_index(drop=True))
         except Exception as e:
             logger.error(f"BBM Error: {e}")
             return pd.DataFrame()
 
-    def _process_ccyb(self):
-        if not self.ccyb_file.exists(): return pd.DataFrame()
+    def _enrich_syrb(self, df):
+        # Rate kinyerés (alapértelmezett), a numerikus rate oszlop elsőbbséget élvez
+        rate = extract_rates(df['description'], percent=True)
+        if 'rate_col' in df.columns:
+            rate = pd.to_numeric(df['rate_col'], errors='coerce').fillna(rate)
+        exposure_type, syrb_type = classify_syrb_exposures(df)
+        return pd.DataFrame({'iso2': self.countries.convert(df['country'], to='iso2'), 'rate_numeric': rate,
+                             'exposure_type': exposure_type, 'syrb_type': syrb_type}, index=df.index)
+
+    def _enrich_bbm(self, df):
+        return pd.DataFrame({'iso2': self.countries.convert(df['country'], to='iso2')}, index=df.index)
+
+    def _enrich_ccyb(self, df):
+        return pd.DataFrame({'iso2': self.countries.convert(df['country'], to='iso2'),
+                             'iso3': self.countries.convert(df['country'], to='iso3'),
+                             'rate': extract_rates(df['rate'])}, index=df.index)
+
+    def _enrich(self, name, df, enrich, incremental=None):
+        """
+        Delta-feldolgozás: a költséges soronkénti lépések (országkód, ráta, besorolás) csak az új vagy
+        módosult ujjlenyomatú sorokon futnak, a többi sor eredménye a processed_*.rows.parquet-ből jön.
+        A sorrend és a típusok megegyeznek a teljes újrafeldolgozáséval (incremental=False).
+        incremental=None: a pipeline beállítása (self.incremental).
+        """
+        store_path = FILES[PROCESSED_KEYS[name]].with_suffix('.rows.parquet')
+        fingerprints = row_fingerprints(df, salt=json.dumps(COUNTRY_OVERRIDES, sort_keys=True)).to_numpy()
+        incremental = self.incremental if incremental is None else incremental
+        store = self._load_row_store(store_path) if incremental else None
+        known = np.isin(fingerprints, store.index.to_numpy()) if store is not None else np.zeros(len(df), dtype=bool)
+        parts = [store] if known.any() else []
+        if not known.all() or not parts:
+            parts.append(enrich(df[~known]).set_axis(fingerprints[~known]))
+            logger.info(f"  {name}: {int((~known).sum())} new/changed row(s) of {len(df)} enriched.")
+        derived = pd.concat(parts) if len(parts) > 1 else parts[0]
+        derived = derived[~derived.index.duplicated()].reindex(fingerprints)
+        for col in derived.columns:
+            df[col] = derived[col].set_axis(df.index)
+        self._store_row_store(store_path, derived[~derived.index.duplicated()])
+        return df
+
+    def _load_row_store(self, path):
+        if not path.exists(): return None
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Row store read error ({path.name}): {e}")
+            return None
+
+    def _store_row_store(self, path, derived):
+        try:
+            derived.rename_axis('fingerprint').to_parquet(path)
+        except Exception as e:
+            logger.warning(f"Row store write skipped ({path.name}): {e}")
+            if path.exists(): path.unlink()
+
+    def _bbm_active_status(self, df):
+        # Határozzuk meg az aktív státuszt (a mai naphoz képest, ezért cache-elt adatnál is újraszámoljuk)
+        def check_active(row):
+            status = str(row.get('status', '')).lower()
+            rev_date = row.get('revocation_date')
+            if 'deactivated' in status or 'revoked' in status or 'expired' in status:
+                return "Inactive"
+            if pd.notna(rev_date) and rev_date <= pd.Timestamp.now():
+                return "Inactive"
+            return "Active"
+        return df.apply(check_active, axis=1)
+
+    def _process_ccyb(self, df=None, incremental=None):
+        if df is None: return self._ccyb_reader(incremental).process()['ccyb_df']
+        if df.empty: return pd.DataFrame()
         try:
-            xl = pd.ExcelFile(self.ccyb_file)
-            df = xl.parse(0, skiprows=find_header_row(xl.parse(0, header=None, nrows=20)))
-            df = clean_columns(df)
             col_map = {}
             for c in df.columns:
                 cl = c.lower().strip()
@@ -195,119 +368,163 @@ class ETLPipeline:
             df = df.rename(columns={v: k for k, v in col_map.items()})
             df['date'] = pd.to_datetime(df['date'], errors='coerce')
             df = df.dropna(subset=['date', 'country'])
-            df['iso2'] = coco.convert(names=df['country'].tolist(), to='iso2', not_found=None)
-            df['iso3'] = coco.convert(names=df['country'].tolist(), to='iso3', not_found=None)
-            from utils import extract_rate
-            df['rate'] = df['rate'].apply(extract_rate)
+            df = self._enrich('ccyb_df', df, self._enrich_ccyb, incremental)
             gap_col = next((c for c in df.columns if 'gap' in c.lower() and 'additional' not in c.lower()), None)
             df['credit_gap'] = pd.to_numeric(df[gap_col], errors='coerce').fillna(0.0) if gap_col else 0.0
-            return df.sort_values(['country', 'date'], ascending=[True, False]).reset_index(drop=True)
+            return apply_schema(df.sort_values(['country', 'date'], ascending=[True, False]).reset_index(drop=True))
         except Exception as e:
             logger.error(f"CCyB Error: {e}")
             return pd.DataFrame()
 
-    def calculate_trends(self, ccyb_df, syrb_df, bbm_df=None):
-        agg_trend_ccyb = pd.DataFrame()
-        syrb_trend = pd.DataFrame()
-        bbm_trend = pd.DataFrame()
+    def _trend_steps(self, instrument, ledger, today):
+        """Diffúziós trend az eseménynaplóból (ledger.diffusion), StepSeries-ként."""
+        counts = diffusion(ledger, instrument, today)
+        if counts.empty: return None
+        columns = TREND_COLUMNS[instrument]
+        if isinstance(counts, pd.Series): return StepSeries.from_series(counts, columns, end=today)
+        return StepSeries(counts.reindex(columns=list(columns), fill_value=0).rename(columns=columns), end=today)
+
+    def dataset_trend(self, name, df, today=None):
+        """Egy adathalmaz diffúziós trendje StepSeries-ként (None, ha nincs adat)."""
+        if df is None or df.empty: return None
+        today = today if today is not None else pd.Timestamp.now().normalize()
+        return self._trend_steps(TREND_KEYS[name], build_ledger({name: df}), today)
+
+    @staticmethod
+    def trend_frame(name, steps):
+        """A StepSeries kompakt táblája a riportok által várt oszlopsorrenddel."""
+        if steps is None: return pd.DataFrame()
+        return steps.to_frame(date_first=name != 'syrb_df')
+
+    def calculate_trends(self, ccyb_df, syrb_df, bbm_df=None, ledger=None):
+        """
+        Diffúziós trendek kompakt (lépcsős) formában: csak a változási pontok + egy záró sor a mai
+        nappal. Mindhárom eszköz ugyanabból az eseménynaplóból, ugyanazzal a motorral (ledger.diffusion) számolódik.
+        A StepSeries objektumok a self.trend_series-ben érhetők el (densify / resample / value_at).
+        """
         today = pd.Timestamp.now().normalize()
+        if ledger is None:
+            ledger = build_ledger({'ccyb_df': ccyb_df, 'syrb_df': syrb_df, 'bbm_df': bbm_df})
+        self.trend_series = {}
+        for key in TREND_KEYS.values():
+            steps = self._trend_steps(key, ledger, today)
+            if steps is not None: self.trend_series[key] = steps
+        return tuple(self.trend_frame(name, self.trend_series.get(key)) for name, key in TREND_KEYS.items())
 
-        if not ccyb_df.empty:
-            pivot = ccyb_df.pivot_table(index='date', columns='country', values='rate', aggfunc='last')
-            full_idx = pd.date_range(start=pivot.index.min(), end=today, freq='D')
-            pivot_filled = pivot.reindex(full_idx).ffill().fillna(0)
-            counts = (pivot_filled > 0.0001).sum(axis=1)
-            agg_trend_ccyb = pd.DataFrame({'date': counts.index, 'n_positive': counts.values}).reset_index(drop=True)
-
-        if not syrb_df.empty:
-            df = syrb_df.dropna(subset=['date'])
-            def get_country_count_series(subset):
-                if subset.empty: return pd.Series(dtype=float)
-                
-                # Szigorúbb logika: országonként és dátumonként nézzük, van-e aktív mérés
-                # Előbb aggregáljuk a napi állapotot országonként
-                subset = subset.copy()
-                # Ha egy nap több bejegyzés van, az utolsó (legfrissebb) döntés számít
-                daily = subset.sort_values('date').groupby(['date', 'country'])['rate_numeric'].last().reset_index()
-                
-                # Pivot országonként
-                p = daily.pivot(index='date', columns='country', values='rate_numeric')
-                
-                # Idővonal kiterjesztése a mai napig
-                full_range = pd.date_range(start=p.index.min(), end=today, freq='D')
-                p_filled = p.reindex(full_range).ffill().fillna(0)
-                
-                # Számoljuk az országokat, ahol a ráta > 0
-                return (p_filled > 0.0001).sum(axis=1)
-
-            gen_counts = get_country_count_series(df[df['syrb_type'] == 'General'])
-            sec_counts = get_country_count_series(df[df['syrb_type'] == 'Sectoral'])
-            if not gen_counts.empty or not sec_counts.empty:
-                all_dates = gen_counts.index.union(sec_counts.index)
-                res = pd.DataFrame(index=all_dates)
-                res['General SyRB'] = gen_counts.reindex(all_dates).ffill().fillna(0)
-                res['Sectoral SyRB'] = sec_counts.reindex(all_dates).ffill().fillna(0)
-                res['date'] = res.index
-                syrb_trend = res.reset_index(drop=True)
-
-        if bbm_df is not None and not bbm_df.empty:
-            # BBM Trend: Országok száma, ahol legalább egy aktív BBM van
-            df = bbm_df.dropna(subset=['date']).copy()
-            
-            # Készítünk egy eseménylistát (aktiválás és deaktiválás)
-            events = []
-            for _, row in df.iterrows():
-                # Aktiválás
-                events.append({'date': row['date'], 'country': row['country'], 'change': 1})
-                # Deaktiválás (ha van)
-                if pd.notna(row.get('revocation_date')):
-                    events.append({'date': row['revocation_date'], 'country': row['country'], 'change': -1})
-                elif 'status' in row and any(s in str(row['status']).lower() for s in ['deactivated', 'revoked', 'expired']):
-                    # Ha a státusz inaktív de nincs visszavonási dátum, akkor feltételezzük 
-                    # (ez bizonytalanabb, de a BoBM táblában gyakran így van)
-                    pass
-
-            if events:
-                ev_df = pd.DataFrame(events).sort_values('date')
-                # Országonkénti aktív mérések száma az időben
-                # Pivot: index=date, columns=country, values=count
-                # Ezt trükkösebben kell: minden országra külön kiszámoljuk az aktív mérések számát
-                all_countries = ev_df['country'].unique()
-                all_dates = pd.date_range(start=ev_df['date'].min(), end=today, freq='D')
-                
-                country_states = pd.DataFrame(index=all_dates)
-                for c in all_countries:
-                    c_ev = ev_df[ev_df['country'] == c].groupby('date')['change'].sum().reindex(all_dates).fillna(0).cumsum()
-                    country_states[c] = (c_ev > 0).astype(int)
-                
-                bbm_trend = pd.DataFrame({
-                    'date': all_dates,
-                    'n_countries': country_states.sum(axis=1)
-                }).reset_index(drop=True)
-
-        return agg_trend_ccyb, syrb_trend, bbm_trend
-
-    def run_pipeline(self):
+    def _source_hashes(self):
+        return {
+            'etl_version': ETL_VERSION,
+            'syrb_source': file_sha256(self.syrb_file) if self.syrb_file.exists() else None,
+            'ccyb_source': file_sha256(self.ccyb_file) if self.ccyb_file.exists() else None,
+        }
+
+    def _load_processed(self, sources):
+        """Visszaadja a korábban mentett processed_* táblákat, ha a forrás nem változott."""
+        manifest = read_json(FILES["etl_manifest"])
+        if manifest.get('sources') != sources: return None
+        frames = {}
+        for name, key in PROCESSED_KEYS.items():
+            if name in manifest.get('outputs', []):
+                if not FILES[key].exists(): return None
+                frames[name] = apply_schema(pd.read_parquet(FILES[key]))
+            else:
+                frames[name] = pd.DataFrame()
+        return frames
+
+    def _save_processed(self, frames, sources):
+        outputs = []
+        for name, key in PROCESSED_KEYS.items():
+            if not frames[name].empty:
+                frames[name].to_parquet(FILES[key])
+                outputs.append(name)
+        write_json(FILES["etl_manifest"], {'sources': sources, 'outputs': outputs})
+
+    def materialize_views(self, frames, force=False):
+        """
+        A "latest / active / decisions" nézetek kiszámítása és mentése a FILES szerinti Parquet fájlokba.
+        Egy nézet csak akkor számolódik újra, ha a forrás tábla tartalma (ill. dátumfüggő nézetnél a nap) változott.
+        """
+        today = pd.Timestamp.now().normalize()
+        manifest = read_json(FILES["views_manifest"])
+        fingerprints = {name: frame_fingerprint(df) for name, df in frames.items()}
+        views, rebuilt = {}, []
+        for view, (source, dated, build) in VIEWS.items():
+            key = f"{VIEWS_VERSION}|{fingerprints[source]}|{today.date() if dated else ''}"
+            path = FILES[view]
+            if not force and manifest.get(view) == key and path.exists():
+                try:
+                    views[view] = apply_schema(pd.read_parquet(path))
+                    continue
+                except Exception as e:
+                    logger.warning(f"View read error ({path.name}): {e}")
+            views[view] = build(frames[source], today)
+            try:
+                views[view].to_parquet(path)
+                manifest[view] = key
+            except Exception as e:
+                logger.warning(f"View write skipped ({view}): {e}")
+                manifest.pop(view, None)
+            rebuilt.append(view)
+        if rebuilt:
+            logger.info(f"  Views rebuilt: {', '.join(rebuilt)}")
+            write_json(FILES["views_manifest"], manifest)
+        return views
+
+    def _save_ledger(self, ledger):
+        try:
+            ledger.to_parquet(FILES["ledger"])
+        except Exception as e:
+            logger.warning(f"Ledger write skipped: {e}")
+
+    def _archive_release(self, frames, sources):
+        try:
+            self.releases.record(frames, sources, {'syrb_source': self.syrb_file, 'ccyb_source': self.ccyb_file})
+        except Exception as e:
+            logger.warning(f"Release archive skipped: {e}")
+
+    def _save_panel(self, ledger, today):
+        try:
+            write_panel(ledger, FILES["panel"], today)
+        except Exception as e:
+            logger.warning(f"Panel write skipped: {e}")
+
+    def run_pipeline(self, force=False):
+        """force=True: teljes újrafeldolgozás (a manifest és a sor-ujjlenyomatok figyelmen kívül hagyásával)."""
+        # Csak erre a futásra: a pipeline beállítása (self.incremental) nem változik
+        incremental = self.incremental and not force
         download_file_safely(self.syrb_url, self.syrb_file)
         download_file_safely(self.ccyb_url, self.ccyb_file)
-        syrb_df = self._process_syrb()
-        ccyb_df = self._process_ccyb()
-        bbm_df = self._process_bbm()
-        agg_trend, syrb_trend, bbm_trend = self.calculate_trends(ccyb_df, syrb_df, bbm_df)
-        def get_latest(df): 
-            if df.empty: return df
-            return df.sort_values('date').groupby('country').tail(1).reset_index(drop=True)
-        latest_syrb = get_latest(syrb_df)
-        latest_ccyb = get_latest(ccyb_df)
-        latest_bbm = bbm_df[bbm_df['active_status'] == 'Active'].reset_index(drop=True) if not bbm_df.empty else pd.DataFrame()
-        
-        if not syrb_df.empty: syrb_df.to_parquet(FILES["syrb_processed"])
-        if not ccyb_df.empty: ccyb_df.to_parquet(FILES["ccyb_processed"])
-        if not bbm_df.empty: bbm_df.to_parquet(FILES["bbm_processed"])
-        
+        sources = self._source_hashes()
+        frames = None if force else self._load_processed(sources)
+        trends = None
+        if frames is not None:
+            logger.info("  Source files unchanged, skipping ETL (using processed parquet).")
+            if not frames['bbm_df'].empty:
+                bbm_df = frames['bbm_df']
+                frames['bbm_df'] = bbm_df.assign(active_status=self._bbm_active_status(bbm_df).astype('category'))
+        else:
+            if self.workers > 1:
+                frames, trends = self._process_parallel(incremental)
+            else:
+                frames = {**self._measures_reader(incremental=incremental).process(), **self._ccyb_reader(incremental).process()}
+            self.countries.save()
+            self._save_processed(frames, sources)
+        self._archive_release(frames, sources)
+        syrb_df, ccyb_df, bbm_df = frames['syrb_df'], frames['ccyb_df'], frames['bbm_df']
+        ledger = build_ledger(frames)
+        self._save_ledger(ledger)
+        self._save_panel(ledger, pd.Timestamp.now().normalize())
+        agg_trend, syrb_trend, bbm_trend = trends or self.calculate_trends(ccyb_df, syrb_df, bbm_df, ledger=ledger)
+        views = self.materialize_views(frames, force=force)
+
         return {
             'ccyb_df': ccyb_df, 'syrb_df': syrb_df, 'bbm_df': bbm_df,
             'agg_trend_df': agg_trend, 'syrb_trend_df': syrb_trend, 'bbm_trend_df': bbm_trend,
-            'latest_ccyb_df': latest_ccyb, 'latest_syrb_df': latest_syrb,
-            'latest_bbm_df': latest_bbm
+            **{f"{view}_df": df for view, df in views.items()},
+            'trend_series': self.trend_series,
+            'state_index': StateIndex(frames),
+            'ledger_df': ledger, 'ledger_state_df': latest_state(ledger), 'change_log_df': change_log(ledger),
+            'diffusion_df': diffusion_breakdowns(ledger, pd.Timestamp.now().normalize()),
+            'panel': PolicyPanel.open(FILES["panel"]),
+            'releases': self.releases
         }
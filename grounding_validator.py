@@ -9,11 +9,11 @@ from urllib.parse import urlparse
 
 import requests
 from langchain_core.messages import HumanMessage
-from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import END, StateGraph
 
 from llm_analysis import df_to_string
+from llm_cache import cached_invoke
+from llm_pool import ChatModelPool
 
 logger = logging.getLogger(__name__)
 
@@ -49,14 +49,6 @@ ANALYSIS_CONSTRAINTS = {
 }
 
 
-def _get_llm(config: Dict[str, Any], temperature: float = 0.2):
-    return ChatGoogleGenerativeAI(
-        model=config["model_name"],
-        temperature=temperature,
-        max_tokens=config.get("max_output_tokens", 1000),
-    )
-
-
 def _safe_json_loads(text: str) -> Optional[Any]:
     try:
         return json.loads(text)
@@ -73,13 +65,13 @@ def _safe_json_loads(text: str) -> Optional[Any]:
     return None
 
 
-def _invoke_json(llm, prompt: str, retry_suffix: str = "", default: Optional[Any] = None) -> Any:
-    res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt)])
+def _invoke_json(llm, prompt: str, retry_suffix: str = "", default: Optional[Any] = None, cache=None) -> Any:
+    res = cached_invoke(llm, [HumanMessage(content=prompt)], cache)
     parsed = _safe_json_loads(res)
     if parsed is not None:
         return parsed
     if retry_suffix:
-        res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt + retry_suffix)])
+        res = cached_invoke(llm, [HumanMessage(content=prompt + retry_suffix)], cache)
         parsed = _safe_json_loads(res)
         if parsed is not None:
             return parsed
@@ -208,13 +200,16 @@ class ValidatorState:
 
 
 class GroundingValidator:
-    def __init__(self, llm_config: Dict[str, Any], search_config: Dict[str, Any], clean_text_func):
+    def __init__(self, llm_config: Dict[str, Any], search_config: Dict[str, Any], clean_text_func, llm_cache=None,
+                 pool: Optional[ChatModelPool] = None):
         self.llm_config = llm_config
         self.search_config = search_config
         self.clean_text = clean_text_func
+        self.llm_cache = llm_cache
+        self.pool = pool or ChatModelPool(llm_config)
 
     def _extract_claims(self, state: ValidatorState) -> ValidatorState:
-        llm = _get_llm(self.llm_config, temperature=0.1)
+        llm = self.pool.get(temperature=0.1)
         analysis_payload = {k: state.analyses.get(k, "") for k in state.analysis_ids}
         prompt = (
             "TASK: Extract 3-6 factual claims from each analysis. "
@@ -228,6 +223,7 @@ class GroundingValidator:
                 prompt,
                 retry_suffix="\nIMPORTANT: Return ONLY valid JSON. No prose, no markdown.",
                 default=None,
+                cache=self.llm_cache,
             )
             if parsed is None:
                 raise ValueError("Claim extraction did not return valid JSON.")
@@ -244,7 +240,7 @@ class GroundingValidator:
         return state
 
     def _verify_claims(self, state: ValidatorState) -> ValidatorState:
-        llm = _get_llm(self.llm_config, temperature=0.1)
+        llm = self.pool.get(temperature=0.1)
         checks = []
         for item in state.claims:
             claim = item["claim"]
@@ -261,6 +257,7 @@ class GroundingValidator:
                     prompt,
                     retry_suffix="\nIMPORTANT: Return ONLY valid JSON. No prose, no markdown.",
                     default=None,
+                    cache=self.llm_cache,
                 )
                 if verdict_obj is None:
                     raise ValueError("Verification did not return valid JSON.")
@@ -287,7 +284,7 @@ class GroundingValidator:
         return state
 
     def _revise_text(self, state: ValidatorState) -> ValidatorState:
-        llm = _get_llm(self.llm_config, temperature=0.3)
+        llm = self.pool.get(temperature=0.3)
         revised = dict(state.analyses)
 
         issue_map: Dict[str, List[Dict[str, Any]]] = {}
@@ -319,7 +316,7 @@ class GroundingValidator:
             )
 
             try:
-                res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt)])
+                res = cached_invoke(llm, [HumanMessage(content=prompt)], self.llm_cache)
                 is_global = analysis_id in {
                     "executive_summary",
                     "ccyb_section_summary",
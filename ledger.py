@@ -0,0 +1,229 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import EURO_AREA
+
+LEDGER_COLUMNS = ['instrument', 'country', 'iso2', 'sub_type', 'category', 'event_type', 'date', 'rate']
+
+# Eszközök leírása (új eszköz = új bejegyzés, nem új kód):
+#   frame: forrás tábla, rate / sub_type / category (további bontás, pl. SyRB kitettség): oszlopnevek (None: nincs), mode:
+#     'level' - az ország állapota a legutolsó ráta (aktív, ha > threshold); a visszavonás 0%-os esemény
+#     'count' - aktiválás +1, visszavonás (revocation_date) -1; aktív, amíg az egyenleg > threshold
+#   same_day: azonos napi 'level' események összevonása - 'last' (a legkésőbbi döntés) vagy 'max' (párhuzamos,
+#     pl. kitettségenkénti intézkedések: bármelyik aktív elég; a visszavonás 0%-a nem írja felül az új döntést)
+#   by_sub_type: a diffúziós számlálás altípusonként történik-e
+#   rate_bands: ráta-küszöbök a diffúziós bontáshoz (országok száma, ahol a ráta >= küszöb)
+INSTRUMENTS = {
+    'ccyb': {'frame': 'ccyb_df', 'rate': 'rate', 'sub_type': None, 'category': None, 'mode': 'level', 'same_day': 'last',
+             'threshold': 0.0001, 'by_sub_type': False, 'rate_bands': (0.5, 1.0, 2.0)},
+    'syrb': {'frame': 'syrb_df', 'rate': 'rate_numeric', 'sub_type': 'syrb_type', 'category': 'exposure_type', 'mode': 'level',
+             'same_day': 'max', 'threshold': 0.0001, 'by_sub_type': True, 'rate_bands': (1.0, 2.0, 3.0)},
+    'bbm': {'frame': 'bbm_df', 'rate': None, 'sub_type': 'measure_type', 'category': None, 'mode': 'count',
+            'threshold': 0, 'by_sub_type': False, 'rate_bands': ()},
+}
+
+# Diffúziós bontások: instrument (összes), sub_type, category, euro_area (időben változó tagság), rate (rate_bands)
+BREAKDOWNS = ('instrument', 'sub_type', 'category', 'euro_area', 'rate')
+DIFFUSION_COLUMNS = ['date', 'instrument', 'breakdown', 'group', 'n_countries']
+
+_EVENT_DELTA = {'activation': 1, 'revocation': -1}
+
+
+def _events(df: pd.DataFrame, instrument: str, spec: dict) -> pd.DataFrame:
+    df = df.dropna(subset=['date', 'country'])
+    # Azonos hatálybalépési napon belül a döntés dátuma szerinti sorrend (a build_ledger stabil rendezése megtartja)
+    if 'decision_date' in df.columns: df = df.sort_values('decision_date', kind='stable', na_position='first')
+    n = len(df)
+    sub_type = df[spec['sub_type']].astype(object).to_numpy() if spec['sub_type'] in df.columns else np.full(n, instrument.upper(), dtype=object)
+    category = df[spec['category']].astype(object).to_numpy() if spec.get('category') in df.columns else np.full(n, None, dtype=object)
+    iso2 = df['iso2'].astype(object).to_numpy() if 'iso2' in df.columns else np.full(n, None, dtype=object)
+    rate = pd.to_numeric(df[spec['rate']], errors='coerce').to_numpy(dtype=float) if spec['rate'] else np.full(n, np.nan)
+    if spec['mode'] == 'level':
+        # A SyRB visszavonási sorai (expand_syrb_trend_events) 'Revoked' státuszú, 0%-os döntések
+        revoked = df['status'].astype(str).eq('Revoked').to_numpy() if 'status' in df.columns else np.zeros(n, dtype=bool)
+        event_type = np.where(revoked, 'revocation', 'decision')
+        return pd.DataFrame({'instrument': instrument, 'country': df['country'].astype(object).to_numpy(), 'iso2': iso2,
+                             'sub_type': sub_type, 'category': category, 'event_type': event_type, 'date': df['date'].to_numpy(), 'rate': rate})
+    events = pd.DataFrame({'instrument': instrument, 'country': df['country'].astype(object).to_numpy(), 'iso2': iso2,
+                           'sub_type': sub_type, 'category': category, 'event_type': 'activation', 'date': df['date'].to_numpy(), 'rate': rate})
+    if 'revocation_date' not in df.columns: return events
+    rev = df['revocation_date'].notna().to_numpy()
+    revocations = events[rev].assign(event_type='revocation', date=df['revocation_date'].to_numpy()[rev], rate=np.nan)
+    return pd.concat([events, revocations], ignore_index=True)
+
+
+def build_ledger(frames: Dict[str, pd.DataFrame], instruments: Optional[Dict[str, dict]] = None) -> pd.DataFrame:
+    """
+    Egységes eseménynapló a processed táblákból: (instrument, country, iso2, sub_type, category, event_type, date, rate),
+    eszköz és dátum szerint stabilan rendezve (azonos napon belül a forrás sorrendje marad).
+    """
+    parts = [_events(frames[spec['frame']], name, spec) for name, spec in (instruments or INSTRUMENTS).items()
+             if frames.get(spec['frame']) is not None and not frames[spec['frame']].empty]
+    if not parts: return pd.DataFrame(columns=LEDGER_COLUMNS)
+    ledger = pd.concat(parts, ignore_index=True).sort_values(['instrument', 'date'], kind='stable', ignore_index=True)
+    return ledger.astype({'instrument': 'category', 'country': 'category', 'sub_type': 'category', 'category': 'category',
+                          'event_type': 'category', 'date': 'datetime64[ns]'})
+
+
+def _state(events: pd.DataFrame, spec: dict, keys: list) -> pd.Series:
+    """(keys..., date) szerinti állapot: 'level' módban a napi ráta (same_day szerint összevonva), 'count' módban a futó egyenleg."""
+    if spec['mode'] == 'level':
+        events = events.dropna(subset=['rate'])
+        return events.groupby(keys + ['date'], observed=True)['rate'].agg(spec.get('same_day', 'last'))
+    delta = events['event_type'].map(_EVENT_DELTA).astype('int64')
+    net = delta.groupby([events[k] for k in keys + ['date']], observed=True).sum()
+    return net.groupby(level=keys, observed=True).cumsum()
+
+
+def _state_matrix(events: pd.DataFrame, spec: dict, key: str) -> pd.DataFrame:
+    """(dátum x (key, country)) állapotmátrix: minden eseménynapon a pozíciók előre kitöltött állapota (kezdetben 0)."""
+    state = _state(events, spec, [key, 'country'])
+    return state.unstack([key, 'country']).ffill().fillna(0)
+
+
+def _group_counts(active: np.ndarray, labels) -> tuple:
+    """Aktív oszlopok száma csoportonként: (dátum x oszlop) 0/1 mátrix @ (oszlop x csoport) maszk."""
+    codes, groups = pd.factorize(np.asarray(labels, dtype=object))
+    masks = (codes[:, None] == np.arange(len(groups))).astype(np.int64)
+    return active.astype(np.int64) @ masks, list(groups)
+
+
+def _euro_area_mask(dates: pd.DatetimeIndex, iso2: pd.Series, euro_area: Dict[str, str]) -> np.ndarray:
+    """(dátum x ország) tagsági maszk a csatlakozási dátumokból (nem tag: NaT, mindig hamis)."""
+    joined = pd.to_datetime(iso2.map(euro_area)).to_numpy()
+    return dates.to_numpy()[:, None] >= joined[None, :]
+
+
+def _by_country(state: pd.DataFrame, spec: dict) -> tuple:
+    """
+    Altípus-szintű állapotmátrix országonként összevonva: (országok, érték, aktív) - az érték 'level' módban
+    a legmagasabb ráta, 'count' módban az aktív intézkedések egyenlege összesen; aktív, ha bármely pozíció aktív.
+    """
+    values = state.to_numpy()
+    active = values > spec['threshold']
+    codes, countries = pd.factorize(np.asarray(state.columns.get_level_values('country'), dtype=object))
+    by_country = (codes[:, None] == np.arange(len(countries))).astype(np.int64)
+    country_active = (active.astype(np.int64) @ by_country) > 0
+    if spec['mode'] == 'level':
+        country_values = np.zeros((len(countries), len(state)))
+        np.maximum.at(country_values, codes, values.T)
+        country_values = country_values.T
+    else:
+        country_values = np.clip(values, 0, None) @ by_country
+    return list(countries), country_values, country_active
+
+
+def country_state(ledger: pd.DataFrame, instrument: str, today=None, instruments: Optional[Dict[str, dict]] = None) -> tuple:
+    """Országonkénti állapot az eseménynapokon: (érték, aktív) DataFrame-ek (index: dátum, oszlop: ország)."""
+    spec = (instruments or INSTRUMENTS)[instrument]
+    events = ledger[ledger['instrument'] == instrument]
+    if today is not None: events = events[events['date'] <= today]
+    if events.empty: return pd.DataFrame(), pd.DataFrame()
+    state = _state_matrix(events, spec, 'sub_type')
+    countries, values, active = _by_country(state, spec)
+    return pd.DataFrame(values, index=state.index, columns=countries), pd.DataFrame(active, index=state.index, columns=countries)
+
+
+def _instrument_breakdowns(events: pd.DataFrame, spec: dict, breakdowns, euro_area, today=None) -> Dict[tuple, pd.Series]:
+    """Egy eszköz összes kért bontása: csoportonkénti aktív országszám az eseménynapokon (és a csatlakozási napokon)."""
+    out = {}
+    # Altípus-szintű állapot: ebből az altípus-bontás, országonként összevonva pedig a teljes / euro / ráta bontás
+    state = _state_matrix(events, spec, 'sub_type')
+    if 'euro_area' in breakdowns:
+        # Az euróövezeti csatlakozás napja akkor is változási pont, ha aznap nincs esemény
+        joined = pd.to_datetime(pd.Series(events['iso2'].dropna().unique(), dtype=object).map(euro_area)).dropna()
+        end = pd.Timestamp(today) if today is not None else state.index.max()
+        joined = pd.DatetimeIndex(joined[(joined > state.index.min()) & (joined <= end)].unique())
+        if len(joined): state = state.reindex(state.index.union(joined)).ffill()
+    dates = state.index
+    if 'sub_type' in breakdowns and spec['sub_type']:
+        counts, groups = _group_counts(state.to_numpy() > spec['threshold'], state.columns.get_level_values('sub_type'))
+        out.update({('sub_type', g): counts[:, i] for i, g in enumerate(groups)})
+
+    countries, values, country_active = _by_country(state, spec)
+    if 'instrument' in breakdowns:
+        out[('instrument', 'All')] = country_active.sum(axis=1)
+    if 'euro_area' in breakdowns:
+        iso2 = events.groupby('country', observed=True)['iso2'].first().reindex(countries)
+        member = _euro_area_mask(dates, iso2, euro_area)
+        out[('euro_area', 'Euro area')] = (country_active & member).sum(axis=1)
+        out[('euro_area', 'Non-euro area')] = (country_active & ~member).sum(axis=1)
+    if 'rate' in breakdowns and spec['rate'] and spec.get('rate_bands'):
+        for band in spec['rate_bands']:
+            out[('rate', f">= {band:g}%")] = (values >= band).sum(axis=1)
+
+    if 'category' in breakdowns and spec.get('category'):
+        cat_events = events[events['category'].notna()]
+        if not cat_events.empty:
+            cat_state = _state_matrix(cat_events, spec, 'category').reindex(dates, method='ffill').fillna(0)
+            counts, groups = _group_counts(cat_state.to_numpy() > spec['threshold'], cat_state.columns.get_level_values('category'))
+            out.update({('category', g): counts[:, i] for i, g in enumerate(groups)})
+    return {key: pd.Series(counts, index=dates) for key, counts in out.items()}
+
+
+def diffusion_breakdowns(ledger: pd.DataFrame, today=None, breakdowns=BREAKDOWNS, instruments: Optional[Dict[str, dict]] = None,
+                         euro_area: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Diffúziós számok több bontásban, eszközönként egy menetben az (ország x dátum) állapotmátrixon:
+    a csoportok aktív országszáma a 0/1 állapotmátrix és a csoportmaszkok szorzata. Hosszú formátum
+    (date, instrument, breakdown, group, n_countries), csak a változási pontokkal (lépcsős függvény).
+    """
+    euro_area = EURO_AREA if euro_area is None else euro_area
+    parts = []
+    for name, spec in (instruments or INSTRUMENTS).items():
+        events = ledger[ledger['instrument'] == name]
+        if today is not None: events = events[events['date'] <= today]
+        if events.empty: continue
+        for (breakdown, group), counts in _instrument_breakdowns(events, spec, breakdowns, euro_area, today).items():
+            changed = counts[counts.diff().ne(0)]
+            parts.append(pd.DataFrame({'date': changed.index, 'instrument': name, 'breakdown': breakdown,
+                                       'group': group, 'n_countries': changed.to_numpy(dtype='int64')}))
+    if not parts: return pd.DataFrame(columns=DIFFUSION_COLUMNS)
+    result = pd.concat(parts, ignore_index=True)
+    return result.astype({'instrument': 'category', 'breakdown': 'category', 'group': 'category'})[DIFFUSION_COLUMNS]
+
+
+def diffusion(ledger: pd.DataFrame, instrument: str, today=None, instruments: Optional[Dict[str, dict]] = None):
+    """
+    Egy eszköz diffúziós száma (aktív országok száma) a diffusion_breakdowns motorral:
+    altípusonkénti számlálásnál DataFrame (oszlop: altípus), különben Series.
+    """
+    spec = (instruments or INSTRUMENTS)[instrument]
+    breakdown = 'sub_type' if spec['by_sub_type'] else 'instrument'
+    long = diffusion_breakdowns(ledger, today, (breakdown,), {instrument: spec})
+    if long.empty: return pd.DataFrame() if spec['by_sub_type'] else pd.Series(dtype='int64')
+    wide = long.pivot(index='date', columns='group', values='n_countries').rename_axis(index=None, columns=None)
+    wide = wide.ffill().fillna(0).astype('int64')
+    if not spec['by_sub_type']: return wide['All'].rename_axis('date')
+    wide.columns = wide.columns.astype(object)
+    return wide.rename_axis('date')
+
+
+def latest_state(ledger: pd.DataFrame, as_of=None, instruments: Optional[Dict[str, dict]] = None) -> pd.DataFrame:
+    """Eszközönként, országonként és altípusonként az állapot az adott napon (alapból a legutolsó esemény után)."""
+    rows = []
+    for name, spec in (instruments or INSTRUMENTS).items():
+        events = ledger[ledger['instrument'] == name]
+        if as_of is not None: events = events[events['date'] <= as_of]
+        if events.empty: continue
+        state = _state(events, spec, ['country', 'sub_type'])
+        last = state.groupby(level=['country', 'sub_type'], observed=True).tail(1).reset_index(name='value')
+        rows.append(last.assign(instrument=name, active=last['value'] > spec['threshold']))
+    if not rows: return pd.DataFrame(columns=['instrument', 'country', 'sub_type', 'date', 'value', 'active'])
+    return pd.concat(rows, ignore_index=True)[['instrument', 'country', 'sub_type', 'date', 'value', 'active']]
+
+
+def change_log(ledger: pd.DataFrame, instruments: Optional[Dict[str, dict]] = None) -> pd.DataFrame:
+    """Csak azok a napok, ahol egy ország (altípus) állapota ténylegesen változott, az előző értékkel együtt."""
+    rows = []
+    for name, spec in (instruments or INSTRUMENTS).items():
+        events = ledger[ledger['instrument'] == name]
+        if events.empty: continue
+        state = _state(events, spec, ['country', 'sub_type']).rename('value')
+        previous = state.groupby(level=['country', 'sub_type'], observed=True).shift()
+        changed = state.ne(previous)
+        rows.append(pd.DataFrame({'value': state[changed], 'previous': previous[changed]}).reset_index().assign(instrument=name))
+    if not rows: return pd.DataFrame(columns=['instrument', 'country', 'sub_type', 'date', 'previous', 'value'])
+    return pd.concat(rows, ignore_index=True)[['instrument', 'country', 'sub_type', 'date', 'previous', 'value']]
@@ -1,17 +1,75 @@
+import asyncio
 import base64
+import hashlib
 import json
 import logging
-import os
 import re
-from langchain_google_genai import ChatGoogleGenerativeAI
+from graphlib import TopologicalSorter
 from langchain_core.messages import HumanMessage
-from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
 from config import LLM_CONFIG
+from llm_cache import cached_ainvoke, cached_invoke, row_key
+from llm_pool import ChatModelPool
+from report_cache import has_content
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Az adatdúsító (enrich) feladatok promptsablonja és temperature-je: a report-cache kulcsnak is része (cache_extra),
+# így egy prompt- vagy modellváltás újraszámolja a táblákat
+ENRICH_PROMPTS = {
+    "clean_rates": (
+        "TASK: Extract the specific SyRB rate or interval. OUTPUT FORMAT: Numbered list. ONLY the rate. INPUT:\n{input_text}",
+        0.0),
+    "keywords": (
+        """TASK: Extract 3-4 professional keywords/phrases for each numbered item.
+        {instr}
+        FORMAT: Return a numbered list matching the input count. Each line should ONLY contain keywords separated by commas.
+        INPUT:
+        {input_text}""",
+        0.0),
+    "ltv_fields": (
+        """TASK: Extract structured LTV policy details from each item.
+OUTPUT: JSON array with one object per item, in the same order.
+Each object must contain:
+  - limits: list of LTV limit strings with % (e.g., ["80%", "90%"])
+  - ftb_flag: "Yes" or "No" if a first-time buyer (FTB) exception exists
+  - ftb_details: short phrase describing the FTB exception (or empty string)
+  - other_exceptions: short phrase for other exceptions/quotas (or empty string)
+Do NOT invent values. Use empty list/strings if not stated.
+INPUT:
+{input_text}""",
+        0.0),
+    "news_tags": (
+        """TASK: Assign zero or more tags to each item from the allowed list.
+ALLOWED TAGS: {allowed_str}
+RETURN: JSON array, each entry is an array of tag strings for the matching item.
+RULES: Only use allowed tags. Use [] if no tags are applicable.
+INPUT:
+{input_text}""",
+        0.0),
+    "news_summaries": (
+        """TASK: Summarize each item in 2-3 concise sentences.
+RULES: Keep it factual and short (max ~60 words). Do not add new facts.
+RETURN: JSON array of strings, in the same order as input.
+INPUT:
+{input_text}""",
+        0.2),
+}
+
+# Szigorúbb szakmai fókusz a kulcsszavakhoz
+KEYWORD_INSTRUCTIONS = (
+    "Focus ONLY on targeted risks (e.g., credit growth, real estate, cyclical risks) and regulatory intent. "
+    "NEVER include technical terms like 'press release', 'notification', 'official', or authority names. "
+    "NO generic phrases."
+)
+NEWS_TAGS = ["ccyb", "syrb", "bbm", "ltv", "dsti", "lti", "dti", "real-estate", "capital", "reciprocation"]
+# A sablonok rögzített paraméterei (a kulcsokba is bekerülnek)
+ENRICH_PARAMS = {
+    "keywords": {"instr": KEYWORD_INSTRUCTIONS},
+    "news_tags": {"allowed_str": ", ".join(NEWS_TAGS)},
+}
+
 def get_base64(path):
     if not path or not path.exists(): return None
     return base64.b64encode(path.read_bytes()).decode('utf-8')
@@ -22,18 +80,15 @@ def df_to_string(df, rows=50):
     return df.head(rows).to_markdown(index=False)
 
 class LLMAnalyzer:
-    def __init__(self, config):
+    def __init__(self, config, llm_cache=None, pool=None):
         self.config = config
+        # llm_cache.LLMCache: azonos kérésekre (modell, temperature, prompt, képek) nincs újabb LLM hívás
+        self.llm_cache = llm_cache
+        # llm_pool.ChatModelPool: a kliensek (és kapcsolataik) újrahasznosítása hívások között
+        self.pool = pool or ChatModelPool(config)
 
     def _get_llm(self, temperature):
-        api_key_env = self.config.get("api_key_env", "GOOGLE_API_KEY")
-        api_key = os.getenv(api_key_env)
-        return ChatGoogleGenerativeAI(
-            model=self.config["model_name"], 
-            temperature=temperature,
-            max_tokens=self.config.get("max_output_tokens", 1000),
-            google_api_key=api_key,
-        )
+        return self.pool.get(temperature)
 
     def _clean_text(self, text, is_global=False):
         if not text: return ""
@@ -73,13 +128,40 @@ class LLMAnalyzer:
             
         return text.strip()
 
+    def cache_extra(self, task, *args):
+        """Az enrich:* report-cache kimenet kulcs-kiegészítése: promptsablon, modell, temperature és a feladat paraméterei."""
+        template, temp = ENRICH_PROMPTS[task]
+        return (template, ENRICH_PARAMS.get(task, {}), self.config["model_name"], temp, *args)
+
+    def _prompt(self, task, text_list, limit):
+        input_text = "\n".join([f"{i+1}. {str(text)[:limit]}" for i, text in enumerate(text_list)])
+        return ENRICH_PROMPTS[task][0].format(input_text=input_text, **ENRICH_PARAMS.get(task, {}))
+
+    def _memoized(self, task, text_list, limit, extract):
+        """
+        Soronkénti memoizálás (llm_cache 'extractions' tábla): kulcs = feladat + promptsablon + modell + a normalizált,
+        a prompttal azonos hosszra vágott szöveg. Csak a hiányzó sorok mennek egy kötegben az LLM-nek; az eredmény kulcs szerint áll össze.
+        """
+        if self.llm_cache is None or not self.llm_cache.enabled: return extract(text_list)
+        prompt = [ENRICH_PROMPTS[task], ENRICH_PARAMS.get(task, {})]
+        keys = [row_key(task, self.config["model_name"], str(text)[:limit], prompt) for text in text_list]
+        known = self.llm_cache.get_rows(keys)
+        missing = {k: text for k, text in zip(keys, text_list) if k not in known}
+        if missing:
+            fresh = dict(zip(missing, extract(list(missing.values()))))
+            self.llm_cache.put_rows(task, {k: v for k, v in fresh.items() if has_content(v)})
+            known.update(fresh)
+        return [known[k] for k in keys]
+
     def extract_clean_rates(self, text_list):
         if not text_list: return []
-        input_text = "\n".join([f"{i+1}. {str(text)[:300]}" for i, text in enumerate(text_list)])
-        prompt = f"TASK: Extract the specific SyRB rate or interval. OUTPUT FORMAT: Numbered list. ONLY the rate. INPUT:\n{input_text}"
+        return self._memoized("clean_rates", text_list, 300, self._extract_clean_rates)
+
+    def _extract_clean_rates(self, text_list):
+        prompt = self._prompt("clean_rates", text_list, 300)
         try:
-            llm = self._get_llm(temperature=0.0)
-            res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt)])
+            llm = self._get_llm(temperature=ENRICH_PROMPTS["clean_rates"][1])
+            res = cached_invoke(llm, [HumanMessage(content=prompt)], self.llm_cache)
             lines = [line.strip() for line in res.split('\n') if line.strip()]
             results = [re.sub(r'^\d+\.?\s*', '', l) for l in lines]
             if len(results) < len(text_list): results.extend(["N/A"]*(len(text_list)-len(results)))
@@ -88,23 +170,13 @@ class LLMAnalyzer:
 
     def extract_keywords(self, text_list, context="justification"):
         if not text_list: return []
-        input_text = "\n".join([f"{i+1}. {str(text)[:500]}" for i, text in enumerate(text_list)])
-        
-        # Szigorúbb szakmai fókusz
-        instr = (
-            "Focus ONLY on targeted risks (e.g., credit growth, real estate, cyclical risks) and regulatory intent. "
-            "NEVER include technical terms like 'press release', 'notification', 'official', or authority names. "
-            "NO generic phrases."
-        )
-        
-        prompt = f"""TASK: Extract 3-4 professional keywords/phrases for each numbered item.
-        {instr}
-        FORMAT: Return a numbered list matching the input count. Each line should ONLY contain keywords separated by commas.
-        INPUT:
-        {input_text}"""
+        return self._memoized("keywords", text_list, 500, lambda texts: self._extract_keywords(texts, context))
+
+    def _extract_keywords(self, text_list, context="justification"):
+        prompt = self._prompt("keywords", text_list, 500)
         try:
-            llm = self._get_llm(temperature=0.0)
-            res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt)])
+            llm = self._get_llm(temperature=ENRICH_PROMPTS["keywords"][1])
+            res = cached_invoke(llm, [HumanMessage(content=prompt)], self.llm_cache)
             # Tisztább sorokra bontás
             lines = [l.strip() for l in res.split('\n') if l.strip() and (l.strip()[0].isdigit() or ',' in l)]
             results = [re.sub(r'^\d+[\.\)]\s*', '', l) for l in lines]
@@ -120,20 +192,10 @@ class LLMAnalyzer:
     def extract_ltv_fields(self, text_list):
         if not text_list:
             return []
-        input_text = "\n".join([f"{i+1}. {str(text)[:800]}" for i, text in enumerate(text_list)])
-        prompt = f"""TASK: Extract structured LTV policy details from each item.
-OUTPUT: JSON array with one object per item, in the same order.
-Each object must contain:
-  - limits: list of LTV limit strings with % (e.g., ["80%", "90%"])
-  - ftb_flag: "Yes" or "No" if a first-time buyer (FTB) exception exists
-  - ftb_details: short phrase describing the FTB exception (or empty string)
-  - other_exceptions: short phrase for other exceptions/quotas (or empty string)
-Do NOT invent values. Use empty list/strings if not stated.
-INPUT:
-{input_text}"""
+        prompt = self._prompt("ltv_fields", text_list, 800)
         try:
-            llm = self._get_llm(temperature=0.0)
-            res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt)])
+            llm = self._get_llm(temperature=ENRICH_PROMPTS["ltv_fields"][1])
+            res = cached_invoke(llm, [HumanMessage(content=prompt)], self.llm_cache)
             parsed = None
             try:
                 parsed = json.loads(res)
@@ -158,21 +220,10 @@ INPUT:
     def classify_news_tags(self, text_list):
         if not text_list:
             return []
-        allowed = [
-            "ccyb", "syrb", "bbm", "ltv", "dsti", "lti", "dti",
-            "real-estate", "capital", "reciprocation"
-        ]
-        allowed_str = ", ".join(allowed)
-        input_text = "\n".join([f"{i+1}. {str(text)[:600]}" for i, text in enumerate(text_list)])
-        prompt = f"""TASK: Assign zero or more tags to each item from the allowed list.
-ALLOWED TAGS: {allowed_str}
-RETURN: JSON array, each entry is an array of tag strings for the matching item.
-RULES: Only use allowed tags. Use [] if no tags are applicable.
-INPUT:
-{input_text}"""
+        prompt = self._prompt("news_tags", text_list, 600)
         try:
-            llm = self._get_llm(temperature=0.0)
-            res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt)])
+            llm = self._get_llm(temperature=ENRICH_PROMPTS["news_tags"][1])
+            res = cached_invoke(llm, [HumanMessage(content=prompt)], self.llm_cache)
             parsed = None
             try:
                 parsed = json.loads(res)
@@ -192,7 +243,7 @@ INPUT:
                 if not isinstance(tags, list):
                     normalized.append([])
                     continue
-                cleaned = [t for t in tags if isinstance(t, str) and t in allowed]
+                cleaned = [t for t in tags if isinstance(t, str) and t in NEWS_TAGS]
                 normalized.append(cleaned)
             return normalized
         except Exception as e:
@@ -202,15 +253,10 @@ INPUT:
     def summarize_news_items(self, text_list):
         if not text_list:
             return []
-        input_text = "\n".join([f"{i+1}. {str(text)[:800]}" for i, text in enumerate(text_list)])
-        prompt = """TASK: Summarize each item in 2-3 concise sentences.
-RULES: Keep it factual and short (max ~60 words). Do not add new facts.
-RETURN: JSON array of strings, in the same order as input.
-INPUT:
-""" + input_text
+        prompt = self._prompt("news_summaries", text_list, 800)
         try:
-            llm = self._get_llm(temperature=0.2)
-            res = (llm | StrOutputParser()).invoke([HumanMessage(content=prompt)])
+            llm = self._get_llm(temperature=ENRICH_PROMPTS["news_summaries"][1])
+            res = cached_invoke(llm, [HumanMessage(content=prompt)], self.llm_cache)
             parsed = None
             try:
                 parsed = json.loads(res)
@@ -231,7 +277,74 @@ INPUT:
             logger.error(f"Error in summarize_news_items: {e}")
             return ["" for _ in text_list]
 
-    def run_analysis(self, data_inputs, plot_paths, contexts):
+    def _chart_message(self, t, plot_paths):
+        """(üzenetek, a csatolt PNG sha256-ja vagy '' ha nincs kép)."""
+        img_path = plot_paths.get(t['img']) if t['img'] else None
+        img_b64 = get_base64(img_path)
+        content = [{"type": "text", "text": t['prompt'] + (f"\nDATA:\n{t['data']}" if t['data'] else "")}]
+        if img_b64: content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img_b64}"}})
+        return [HumanMessage(content=content)], hashlib.sha256(img_b64.encode()).hexdigest() if img_b64 else ""
+
+    def _task_request(self, t, plot_paths, inputs):
+        """
+        (üzenetek, cache extra) egy csomóponthoz; az összefoglalók promptja a bemeneti elemzések szövegéből épül.
+        A grafikon-elemzések kulcsában a csatolt kép hash-e is benne van: kép nélküli (sikertelen export) vagy
+        csak vizuálisan módosult ábrához készült elemzés nem kerül újrafelhasználásra.
+        """
+        if callable(t['prompt']):
+            prompt = t['prompt'](inputs)
+            return [HumanMessage(content=prompt)], (prompt, t['temp'])
+        messages, image = self._chart_message(t, plot_paths)
+        return messages, (t['prompt'], t['data'], t['temp'], image)
+
+    async def _run_task(self, t, plot_paths, inputs, cache, semaphore, timeout):
+        messages, extra = self._task_request(t, plot_paths, inputs)
+        output, extra = f"analysis:{t['id']}", (*extra, self.config["model_name"])
+        hit, value = cache.lookup(output, extra) if cache is not None else (False, None)
+        if hit: return value
+        async with semaphore:
+            logger.info(f"  🧠 Elemzés: {t['id']}...")
+            try:
+                llm = self._get_llm(temperature=t['temp'])
+                res = await asyncio.wait_for(cached_ainvoke(llm, messages, self.llm_cache), timeout)
+                # Egy nem szöveges / hibás válasz tisztítása se buktassa el a terv többi csomópontját
+                value = self._clean_text(res, is_global=t.get('global', False))
+            except asyncio.TimeoutError:
+                logger.warning(f"  Analysis {t['id']} timed out after {timeout}s.")
+                return "N/A"
+            except Exception as e:
+                logger.warning(f"  Analysis {t['id']} failed: {e}")
+                return "N/A"
+        if cache is not None and has_content(value): cache.store(output, value, extra)
+        return value
+
+    async def _run_plan(self, tasks, plot_paths, cache):
+        """
+        Az elemzési terv DAG-ként (task id -> bemenetek): minden csomópont azonnal indul, amint a saját bemenetei
+        elkészültek, a független ágak párhuzamosan futnak (egyszerre legfeljebb 'concurrency' LLM hívás).
+        """
+        plan = {t['id']: t.get('inputs', []) for t in tasks}
+        order = list(TopologicalSorter(plan).static_order())
+        unknown = set(order) - set(plan)
+        if unknown: raise ValueError(f"Analysis plan references unknown task(s): {', '.join(sorted(unknown))}")
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get("concurrency", 4))))
+        timeout = self.config.get("timeout", 120)
+        by_id, futures = {t['id']: t for t in tasks}, {}
+
+        async def run(t):
+            inputs = {dep: await futures[dep] for dep in plan[t['id']]}
+            return await self._run_task(t, plot_paths, inputs, cache, semaphore, timeout)
+
+        for task_id in order: futures[task_id] = asyncio.ensure_future(run(by_id[task_id]))
+        try:
+            done = dict(zip(futures, await asyncio.gather(*futures.values())))
+        finally:
+            # Az async kliensek ehhez a loophoz kötődnek (asyncio.run után már nem használhatók)
+            await self.pool.aclose_loop()
+        return {task_id: done[task_id] for task_id in plan}
+
+    def run_analysis(self, data_inputs, plot_paths, contexts, cache=None):
+        """cache: report_cache.ReportCache - csak azok az elemzések futnak újra, amelyek bemenete változott."""
         latest_ccyb_str = df_to_string(data_inputs.get('latest_ccyb_df'))
         ccyb_decisions_str = df_to_string(data_inputs.get('ccyb_decisions_df'))
         active_syrb_str = df_to_string(data_inputs.get('active_syrb_df'))
@@ -271,87 +384,63 @@ INPUT:
             {"id": "news_summary", "img": None, "data": news_str, "temp": 0.2, "prompt": "Summarize the most important macroprudential news from the last 12 months. Focus on objectives and risks cited. Write ONE paragraph of 4-5 sentences."}
         ]
 
-        results = {}
-        for t in chart_tasks:
-            logger.info(f"  🧠 Elemzés: {t['id']}...")
-            try:
-                img_path = plot_paths.get(t['img']) if t['img'] else None
-                img_b64 = get_base64(img_path)
-                content = [{"type": "text", "text": t['prompt'] + (f"\nDATA:\n{t['data']}" if t['data'] else "")}]
-                if img_b64: content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img_b64}"}})
-                llm = self._get_llm(temperature=t.get('temp', 0.2))
-                res = (llm | StrOutputParser()).invoke([HumanMessage(content=content)])
-                results[t['id']] = self._clean_text(res, is_global=False)
-            except: results[t['id']] = "N/A"
-
-        # 2. LÉPÉS: Fejezet összefoglalók (már látják a rész-elemzéseket is)
-        logger.info("  🧠 Section Summaries...")
-        try:
-            # CCyB Section Summary
-            ccyb_summ_prompt = f"""
+        # 2. LÉPÉS: Fejezet összefoglalók (csak a saját fejezetük elemzéseire várnak)
+        summary_tasks = [
+            {"id": "ccyb_section_summary", "temp": 0.3, "global": True,
+             "inputs": ["ccyb_diffusion_analysis", "ccyb_level_analysis", "risk_analysis_text", "ccyb_decisions_analysis"],
+             "prompt": lambda r: f"""
             {system_context}
             TASK: Write a SPECIFIC high-level summary of the CCyB section focused on the last 12 months.
             INPUTS (Context from charts):
-            - Adoption Trends: {results.get('ccyb_diffusion_analysis')}
-            - Current Levels: {results.get('ccyb_level_analysis')}
-            - Risks: {results.get('risk_analysis_text')}
-            - Decisions: {results.get('ccyb_decisions_analysis')}
+            - Adoption Trends: {r['ccyb_diffusion_analysis']}
+            - Current Levels: {r['ccyb_level_analysis']}
+            - Risks: {r['risk_analysis_text']}
+            - Decisions: {r['ccyb_decisions_analysis']}
             
             STRUCTURE: 1-2 bullet points (HTML <li> tags). 
             REQUIREMENT: Be analytical. Emphasize country objectives and the risks being addressed. Avoid tool descriptions or mechanism explanations.
-            """
-            res_ccyb = (self._get_llm(0.3) | StrOutputParser()).invoke([HumanMessage(content=ccyb_summ_prompt)])
-            results['ccyb_section_summary'] = self._clean_text(res_ccyb, is_global=True)
-
-            # SyRB Section Summary
-            syrb_summ_prompt = f"""
+            """},
+            {"id": "syrb_section_summary", "temp": 0.3, "global": True,
+             "inputs": ["syrb_trend_analysis", "syrb_sectoral_analysis", "syrb_active_analysis", "syrb_decisions_analysis"],
+             "prompt": lambda r: f"""
             {system_context}
             TASK: Write a SPECIFIC high-level summary of the SyRB section focused on the last 12 months.
             INPUTS (Context from charts):
-            - Usage Trends: {results.get('syrb_trend_analysis')}
-            - Sectoral Focus: {results.get('syrb_sectoral_analysis')}
-            - Active Measures: {results.get('syrb_active_analysis')}
-            - Recent Decisions: {results.get('syrb_decisions_analysis')}
+            - Usage Trends: {r['syrb_trend_analysis']}
+            - Sectoral Focus: {r['syrb_sectoral_analysis']}
+            - Active Measures: {r['syrb_active_analysis']}
+            - Recent Decisions: {r['syrb_decisions_analysis']}
             
             STRUCTURE: 1-2 bullet points (HTML <li> tags).
             REQUIREMENT: Be analytical. Emphasize objectives and targeted risks (e.g., sectoral exposures). Avoid tool descriptions or mechanism explanations.
-            """
-            res_syrb = (self._get_llm(0.3) | StrOutputParser()).invoke([HumanMessage(content=syrb_summ_prompt)])
-            results['syrb_section_summary'] = self._clean_text(res_syrb, is_global=True)
-
-            # BBM Section Summary
-            bbm_summ_prompt = f"""
+            """},
+            {"id": "bbm_section_summary", "temp": 0.3, "global": True,
+             "inputs": ["bbm_analysis"],
+             "prompt": lambda r: f"""
             {system_context}
             TASK: Write a SPECIFIC high-level summary of the Borrower-Based Measures (BBM) section focused on the last 12 months.
             INPUTS (Context from analysis):
-            - Active BBM Analysis: {results.get('bbm_analysis')}
+            - Active BBM Analysis: {r['bbm_analysis']}
             
             STRUCTURE: 1-2 bullet points (HTML <li> tags).
             REQUIREMENT: Be analytical. Emphasize objectives and risks (housing leverage, affordability, credit quality). Avoid tool descriptions or mechanism explanations.
-            """
-            res_bbm = (self._get_llm(0.3) | StrOutputParser()).invoke([HumanMessage(content=bbm_summ_prompt)])
-            results['bbm_section_summary'] = self._clean_text(res_bbm, is_global=True)
-        except Exception as e:
-            logger.error(f"Error in section summaries: {e}")
+            """},
 
-        # 3. LÉPÉS: Global Executive Summary (már a fejezet-összefoglalókból építkezik)
-        logger.info("  🧠 Global Summary...")
-        try:
-            exec_prompt = f"""
+            # 3. LÉPÉS: Global Executive Summary (a három fejezet-összefoglalóból építkezik)
+            {"id": "executive_summary", "temp": 0.5, "global": True,
+             "inputs": ["ccyb_section_summary", "syrb_section_summary", "bbm_section_summary"],
+             "prompt": lambda r: f"""
             {system_context}
             TASK: Write a comprehensive Global Executive Summary focused on the last 12 months.
             STRUCTURE: 4-5 paragraphs, each 5-6 sentences long. Each paragraph must start with a <b>bold topic sentence</b>.
             CONTENT: Synthesize the findings. Emphasize country objectives and the risks being addressed, and how recent trends shifted the overall stance. Avoid explaining tool mechanics.
     
     INPUTS:
-            CCyB Overview: {results.get('ccyb_section_summary')}
-            SyRB Overview: {results.get('syrb_section_summary')}
-            BBM Overview: {results.get('bbm_section_summary')}
-            """
-            res_global = (self._get_llm(0.5) | StrOutputParser()).invoke([HumanMessage(content=exec_prompt)])
-            results['executive_summary'] = self._clean_text(res_global, is_global=True)
-        except: results['executive_summary'] = "N/A"
-        
-        return results
-        
-        return results
\ No newline at end of file
+            CCyB Overview: {r['ccyb_section_summary']}
+            SyRB Overview: {r['syrb_section_summary']}
+            BBM Overview: {r['bbm_section_summary']}
+            """},
+        ]
+
+        # A teljes terv egy ütemezőben: a kritikus út ábra-elemzés -> fejezet-összefoglaló -> vezetői összefoglaló
+        return asyncio.run(self._run_plan(chart_tasks + summary_tasks, plot_paths, cache))
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extractions (
+    key TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE INDEX IF NOT EXISTS extractions_accessed ON extractions (accessed);
+"""
+
+
+def _content_parts(content) -> List[Any]:
+    """Üzenet-tartalom a kulcshoz: a szöveg szó szerint, a csatolt képek csak sha256 hash-ként."""
+    if isinstance(content, str): return [content]
+    parts = []
+    for part in content:
+        if isinstance(part, dict) and part.get("type") == "image_url":
+            url = part["image_url"]["url"] if isinstance(part["image_url"], dict) else part["image_url"]
+            parts.append({"image": hashlib.sha256(str(url).encode()).hexdigest()})
+        else:
+            parts.append(part)
+    return parts
+
+
+def request_key(llm, messages) -> str:
+    """Kulcs: modell, temperature, max token, és az üzenetek (szöveg + kép-hash-ek)."""
+    payload = [
+        LLM_CACHE_VERSION,
+        getattr(llm, "model", None), getattr(llm, "temperature", None), getattr(llm, "max_output_tokens", None),
+        [[m.type, _content_parts(m.content)] for m in messages],
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def row_key(task: str, model: Optional[str], text: str, prompt: Any = None) -> str:
+    """Soronkénti kinyerés kulcsa: feladat, modell, a promptsablon (ha van) és a whitespace-normalizált szöveg."""
+    payload = [LLM_CACHE_VERSION, task, model, " ".join(str(text).split())] + ([prompt] if prompt is not None else [])
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Perzisztens LLM válasz-cache (SQLite, data/llm_cache.sqlite): azonos modell / temperature / prompt / kép
+    esetén a korábbi válasz jön vissza LLM hívás nélkül; az 'extractions' tábla a soronkénti kinyerések
+    (kulcsszavak, ráták) memója. Lejárat: ttl_days; méretkorlát: max_entries és max_mb,
+    a legrégebben használt bejegyzések törlésével (LRU). bypass: nem olvas a cache-ből, de a friss válaszokat eltárolja.
+    """
+
+    def __init__(self, path: Path, ttl_days: float = 30, max_entries: int = 5000, max_mb: float = 200,
+                 enabled: bool = True, bypass: bool = False):
+        self.path = Path(path)
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+        self.bypass = bypass
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self.row_hits = self.row_misses = 0
+        self.conn = None
+        if not enabled: return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(_SCHEMA)
+            self._expire()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache disabled ({self.path}): {e}")
+            self.conn = None
+
+    @classmethod
+    def from_config(cls, path: Path, config: Dict[str, Any]) -> "LLMCache":
+        bypass = config.get("bypass", False)
+        env_val = os.getenv(config.get("bypass_env", "LLM_CACHE_BYPASS"))
+        if env_val is not None:
+            bypass = env_val.strip().lower() in ("1", "true", "yes", "on")
+        return cls(path, config.get("ttl_days", 30), config.get("max_entries", 5000), config.get("max_mb", 200),
+                   config.get("enabled", True), bypass)
+
+    @property
+    def enabled(self) -> bool:
+        return self.conn is not None
+
+    def _expire(self):
+        if self.ttl is None: return
+        for table in ("responses", "extractions"):
+            cur = self.conn.execute(f"DELETE FROM {table} WHERE created < ?", (time.time() - self.ttl,))
+            self.evictions += max(cur.rowcount, 0)
+
+    def _evict(self, table: str = "responses"):
+        """Méretkorlát: a legutóbb használt bejegyzések maradnak, amíg a darabszám és az összméret belefér."""
+        if self.max_entries:
+            cur = self.conn.execute(
+                f"DELETE FROM {table} WHERE key IN (SELECT key FROM {table} ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+            self.evictions += max(cur.rowcount, 0)
+        if table != "responses": return
+        if self.max_bytes:
+            cur = self.conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER "
+                "(ORDER BY accessed DESC, key) AS total FROM responses) WHERE total > ?)", (self.max_bytes,))
+            self.evictions += max(cur.rowcount, 0)
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled or self.bypass: return None
+        now = time.time()
+        try:
+            row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and row[1] < now - self.ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if row:
+                self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: str, model: Optional[str] = None):
+        if not self.enabled or not isinstance(response, str) or not response.strip(): return
+        now = time.time()
+        try:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, model, response, len(response.encode("utf-8")), now, now))
+            self.stores += 1
+            self._evict()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def get_rows(self, keys: List[str]) -> Dict[str, Any]:
+        """A már kinyert sorok (kulcs -> érték); a hiányzók nem szerepelnek az eredményben."""
+        found = {}
+        if self.enabled and not self.bypass:
+            now, unique = time.time(), list(dict.fromkeys(keys))
+            try:
+                for i in range(0, len(unique), 500):
+                    chunk = unique[i:i + 500]
+                    marks = ",".join("?" * len(chunk))
+                    rows = self.conn.execute(f"SELECT key, value, created FROM extractions WHERE key IN ({marks})", chunk).fetchall()
+                    found.update({k: json.loads(v) for k, v, created in rows if self.ttl is None or created >= now - self.ttl})
+                    self.conn.execute(f"UPDATE extractions SET accessed = ? WHERE key IN ({marks})", (now, *chunk))
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache read failed: {e}")
+        self.row_hits += sum(k in found for k in keys)
+        self.row_misses += sum(k not in found for k in keys)
+        return found
+
+    def put_rows(self, task: str, values: Dict[str, Any]):
+        if not self.enabled or not values: return
+        now = time.time()
+        try:
+            self.conn.executemany("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?)",
+                                  [(k, task, json.dumps(v, ensure_ascii=False), now, now) for k, v in values.items()])
+            self._evict("extractions")
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def invoke(self, llm, messages) -> str:
+        key = request_key(llm, messages)
+        cached = self.get(key)
+        if cached is not None: return cached
+        res = (llm | StrOutputParser()).invoke(messages)
+        self.put(key, res, getattr(llm, "model", None))
+        return res
+
+    async def ainvoke(self, llm, messages) -> str:
+        key = request_key(llm, messages)
+        cached = self.get(key)
+        if cached is not None: return cached
+        res = await (llm | StrOutputParser()).ainvoke(messages)
+        self.put(key, res, getattr(llm, "model", None))
+        return res
+
+    def stats(self) -> Dict[str, int]:
+        entries = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone() if self.enabled else (0, 0)
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "evictions": self.evictions,
+                "row_hits": self.row_hits, "row_misses": self.row_misses, "entries": entries[0], "bytes": entries[1]}
+
+    def close(self):
+        if self.enabled:
+            logger.info("  LLM cache: {hits} hit(s), {misses} miss(es), {stores} stored, {evictions} evicted "
+                        "({entries} entries, {bytes} bytes); rows: {row_hits} memoized, {row_misses} extracted.".format(**self.stats()))
+            self.conn.close()
+            self.conn = None
+
+
+def cached_invoke(llm, messages, cache: Optional[LLMCache] = None) -> str:
+    """(llm | StrOutputParser()).invoke, a válasz-cache-en keresztül, ha van."""
+    if cache is None: return (llm | StrOutputParser()).invoke(messages)
+    return cache.invoke(llm, messages)
+
+
+async def cached_ainvoke(llm, messages, cache: Optional[LLMCache] = None) -> str:
+    if cache is None: return await (llm | StrOutputParser()).ainvoke(messages)
+    return await cache.ainvoke(llm, messages)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+logger = logging.getLogger(__name__)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class ChatModelPool:
+    """
+    Megosztott ChatGoogleGenerativeAI példányok (modell, temperature, max token) szerint: a mögöttes google-genai
+    kliens (httpx, keep-alive) és a kapcsolatai a futás alatt újrahasznosulnak, az API kulcsot egyszer olvassuk be.
+    Az async kliens az első event loophoz kötődik, ezért egy futó loopban kért példány loop-onként külön van,
+    és a loop vége előtt aclose_loop() zárja le; close() a többit.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.api_key = os.getenv(config.get("api_key_env", "GOOGLE_API_KEY"))
+        self._models: Dict[Tuple, ChatGoogleGenerativeAI] = {}
+        self._lock = threading.Lock()
+
+    def get(self, temperature: float = 0.2, model: Optional[str] = None, max_tokens: Optional[int] = None) -> ChatGoogleGenerativeAI:
+        loop = _running_loop()
+        key = (model or self.config["model_name"], float(temperature),
+               max_tokens or self.config.get("max_output_tokens", 1000), id(loop) if loop else None)
+        with self._lock:
+            llm = self._models.get(key)
+            if llm is None:
+                llm = self._models[key] = ChatGoogleGenerativeAI(
+                    model=key[0],
+                    temperature=key[1],
+                    max_tokens=key[2],
+                    google_api_key=self.api_key,
+                )
+            return llm
+
+    def _take(self, loop_id: Optional[int] = None, every: bool = False):
+        with self._lock:
+            keys = [k for k in self._models if every or k[3] == loop_id]
+            return [self._models.pop(k) for k in keys]
+
+    async def aclose_loop(self):
+        """Az aktuális event loophoz kötött példányok lezárása (a loop vége előtt hívandó)."""
+        loop = _running_loop()
+        for llm in self._take(id(loop) if loop else None):
+            try:
+                await llm.aclose()
+            except Exception as e:
+                logger.debug(f"Chat model close failed: {e}")
+
+    def close(self):
+        """Minden még nyitott példány szinkron kliensének lezárása (a futás végén)."""
+        for llm in self._take(every=True):
+            try:
+                if llm.client is not None: llm.client.close()
+            except Exception as e:
+                logger.debug(f"Chat model close failed: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
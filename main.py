@@ -7,8 +7,12 @@ import requests
 import pandas as pd
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
-from config import BASE_DIR, DATA_DIR, URLS, FIGURES_DIR, REPORTS_DIR, LLM_CONFIG, SEARCH_CONFIG, NEWS_CONFIG
-from utils import ensure_dirs
+from config import BASE_DIR, DATA_DIR, URLS, FIGURES_DIR, REPORTS_DIR, FILES, LLM_CONFIG, LLM_CACHE_CONFIG, SEARCH_CONFIG, NEWS_CONFIG, REPORT_CONFIG
+from utils import ensure_dirs, write_text_if_changed
+from report_cache import ReportCache, fingerprint
+from llm_cache import LLMCache
+from llm_pool import ChatModelPool
+from schema import enable_copy_on_write
 from etl import ETLPipeline
 from visualizer import Visualizer
 from llm_analysis import LLMAnalyzer
@@ -22,6 +26,7 @@ logger = logging.getLogger("MAIN")
 
 def main():
     logger.info("STARTING...")
+    enable_copy_on_write()
     run_grounding = False
     try:
         answer = input("Run grounded validation? (y/N): ").strip().lower()
@@ -36,64 +41,45 @@ def main():
     logger.info("1. Adatfeldolgozás...")
     etl = ETLPipeline(DATA_DIR, URLS["ccyb"], URLS["syrb"])
     data = etl.run_pipeline()
+
+    # Változás-hatás térkép: az artefaktumok ujjlenyomata dönti el, mely kimenetek készülnek újra
+    cache = ReportCache(FILES["report_cache"], REPORT_CONFIG.get("incremental", True))
+    # A trend táblák utolsó (mai napi záró) sora naponta változik, a változási pontok nem
+    def trend_points(df):
+        return df.iloc[:-1] if df is not None and not df.empty else df
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    cache.register(
+        agg_trend=trend_points(data.get('agg_trend_df')), syrb_trend=trend_points(data.get('syrb_trend_df')),
+        bbm_trend=trend_points(data.get('bbm_trend_df')), ccyb_history=data.get('ccyb_df'),
+        latest_ccyb=data.get('latest_ccyb_df'), latest_syrb=data.get('latest_syrb_df'), active_bbm=data.get('latest_bbm_df'),
+        ccyb_decisions=data.get('ccyb_decisions_df'), syrb_decisions=data.get('syrb_decisions_df'),
+        active_syrb=data.get('active_syrb_df'), bbm_decisions=data.get('bbm_decisions_df'), ref_date=today_str,
+    )
+    changed = cache.changed()
+    logger.info(f"   -> Changed inputs: {', '.join(sorted(changed)) or 'none'} ({len(cache.impacted(changed))} dependent output(s))")
     
-    # --- CCyB Tables ---
-    ccyb_full = data.get('ccyb_df')
-    ccyb_decisions = pd.DataFrame()
-    if ccyb_full is not None and not ccyb_full.empty:
-        # A legfrissebb döntések kiválasztása
-        temp = ccyb_full.sort_values(['decision_date', 'date'], ascending=[False, False]).head(10).copy()
-        
-        # Oszlopok kiválasztása - FONTOS: kisbetűvel, mert az ETL pipeline így adja át
-        req = ['iso2', 'decision_date', 'date', 'rate', 'justification']
-        ccyb_decisions = temp[[c for c in req if c in temp.columns]].copy()
-        
-        # Dátum formázás
-        for col in ['decision_date', 'date']:
-            if col in ccyb_decisions.columns:
-                ccyb_decisions[col] = pd.to_datetime(ccyb_decisions[col]).dt.strftime('%Y-%m-%d')
-
-    # --- SyRB Tables (Szigorú szűrés) ---
-    syrb_full = data.get('syrb_df')
-    syrb_decisions = pd.DataFrame()
-    active_syrb = pd.DataFrame()
-    
-    today = pd.Timestamp.now()
-    
-    if syrb_full is not None and not syrb_full.empty:
-        # A) LATEST DECISIONS
-        syrb_decisions = syrb_full.sort_values('date', ascending=False).head(10).copy()
-        cols_needed = ['date', 'iso2', 'syrb_type', 'exposure_type', 'rate_text', 'description']
-        syrb_decisions = syrb_decisions[[c for c in cols_needed if c in syrb_decisions.columns]]
-        if 'date' in syrb_decisions.columns: 
-            syrb_decisions['date'] = pd.to_datetime(syrb_decisions['date']).dt.strftime('%Y-%m-%d')
-
-        # B) CURRENTLY ACTIVE MEASURES (Szigorúbb logika)
-        status_str = syrb_full['status'].astype(str)
-        mask_active = (
-            status_str.str.contains('applicable|active', case=False, na=False) |
-            (syrb_full['date'] > today)
-        ) & (~status_str.str.contains('Deactivated|Revoked|No longer', case=False, na=False))
-        
-        df_active = syrb_full[mask_active].sort_values('date', ascending=False)
-        active_syrb = df_active.groupby(['iso2', 'exposure_type']).head(1).copy()
-        
-        if 'rate_numeric' in active_syrb.columns:
-            active_syrb = active_syrb[active_syrb['rate_numeric'] > 0].copy()
+    # --- CCyB / SyRB Tables (az ETL által materializált nézetekből) ---
+    ccyb_decisions = data.get('ccyb_decisions_df', pd.DataFrame())
+    syrb_decisions = data.get('syrb_decisions_df', pd.DataFrame())
+    active_syrb = data.get('active_syrb_df', pd.DataFrame())
 
-        active_syrb = active_syrb[[c for c in cols_needed if c in active_syrb.columns]]
-        if 'date' in active_syrb.columns: 
-            active_syrb['date'] = pd.to_datetime(active_syrb['date']).dt.strftime('%Y-%m-%d')
+    # Dátum formázás
+    for df, cols in ((ccyb_decisions, ['decision_date', 'date']), (syrb_decisions, ['date']), (active_syrb, ['date'])):
+        for col in cols:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
 
     # 2. Vizualizáció
     logger.info("2. Grafikonok...")
-    viz = Visualizer(FIGURES_DIR)
-    today_str = datetime.now().strftime("%Y-%m-%d")
+    viz = Visualizer(FIGURES_DIR, cache)
     plots_inline, plot_figs, download_data, paths = viz.generate_all_plots(data, today_str)
     
     # 3. AI Elemzés
     logger.info("3. AI Elemzés...")
-    analyzer = LLMAnalyzer(LLM_CONFIG)
+    llm_cache = LLMCache.from_config(FILES["llm_cache"], LLM_CACHE_CONFIG)
+    # Egy kliens-pool a teljes futásra: az elemző és a validátor ugyanazokat a kapcsolatokat használja
+    llm_pool = ChatModelPool(LLM_CONFIG)
+    analyzer = LLMAnalyzer(LLM_CONFIG, llm_cache, llm_pool)
     
     # --- CCyB Enrichment ---
     if not ccyb_decisions.empty:
@@ -109,7 +95,8 @@ def main():
 
             # Ha van legalább egy nem üres szövegünk
             if any(len(j.strip()) > 5 for j in raw_justs):
-                kws = analyzer.extract_keywords(raw_justs, "justification")
+                kws = cache.get_or_compute('enrich:ccyb_keywords', lambda: analyzer.extract_keywords(raw_justs, "justification"),
+                                           extra=analyzer.cache_extra("keywords", "justification"))
                 ccyb_decisions['justification'] = kws
                 logger.info(f"      [Debug] Generated keywords: {kws[:3]}...")
             else:
@@ -130,12 +117,12 @@ def main():
         logger.info(f"   -> SyRB AI cleaning ({label})...")
         combined_text = "Rate col: " + df['rate_text'].astype(str) + " | Desc: " + df['description'].astype(str)
         
-        # 1. Rate
-        clean_rates = analyzer.extract_clean_rates(combined_text.tolist())
+        # 1. Rate, 2. Details (Targeted risks/background)
+        clean_rates, details = cache.get_or_compute(f"enrich:syrb_{label.lower()}", lambda: (
+            analyzer.extract_clean_rates(combined_text.tolist()),
+            analyzer.extract_keywords(df['description'].astype(str).tolist(), "targeted risk or background")),
+            extra=analyzer.cache_extra("clean_rates") + analyzer.cache_extra("keywords", "targeted risk or background"))
         df['rate_text'] = clean_rates
-        
-        # 2. Details (Targeted risks/background)
-        details = analyzer.extract_keywords(df['description'].astype(str).tolist(), "targeted risk or background")
         df['description'] = details
         
         df.columns = [c.upper() for c in df.columns]
@@ -146,8 +133,8 @@ def main():
 
     # --- BBM Processing ---
     bbm_full = data.get('bbm_df')
-    active_bbm = pd.DataFrame()
-    bbm_decisions = pd.DataFrame()
+    active_bbm = data.get('latest_bbm_df', pd.DataFrame())
+    bbm_decisions = data.get('bbm_decisions_df', pd.DataFrame())
     bbm_pivot_html = ""
     bbm_ref_date = ""
     ltv_table = pd.DataFrame()
@@ -184,8 +171,6 @@ def main():
             return limits_str, ftb_flag, ftb_details, other_details
 
         # A) Aktív eszközök (Pivot Table)
-        active_bbm = bbm_full[bbm_full['active_status'] == 'Active'].copy()
-        
         if not bbm_full.empty:
             max_date = bbm_full['date'].max()
             if pd.notna(max_date):
@@ -201,7 +186,7 @@ def main():
                 'Flexibility quota': 'Flex.',
                 'Stress test / sensitivity test': 'Stress T.'
             }
-            bbm_matrix = bbm_full.copy()
+            bbm_matrix = bbm_full.copy(deep=False)
             bbm_matrix['measure_short'] = bbm_matrix['measure_type'].map(lambda x: rename_map.get(x, x))
 
             def status_flag(row):
@@ -226,7 +211,8 @@ def main():
                 index='iso2',
                 columns='measure_short',
                 values='status_flag',
-                aggfunc=pick_flag
+                aggfunc=pick_flag,
+                observed=True
             ).fillna('')
             
             pivot_df.index.name = 'COUNTRY'
@@ -245,14 +231,16 @@ def main():
         ltv_active = bbm_full[
             (bbm_full['active_status'] == 'Active') &
             (bbm_full['measure_type'].astype(str).str.contains('LTV', case=False, na=False))
-        ].copy()
+        ]
         if not ltv_active.empty:
             max_date = ltv_active['date'].max()
             if pd.notna(max_date):
                 ltv_ref_date = max_date.strftime('%Y-%m-%d')
 
             descriptions = ltv_active['description'].fillna('').astype(str).tolist()
-            ltv_llm = analyzer.extract_ltv_fields(descriptions)
+            cache.register(ltv_measures=ltv_active[['country', 'measure_type', 'date', 'description']])
+            ltv_llm = cache.get_or_compute('enrich:ltv_fields', lambda: analyzer.extract_ltv_fields(descriptions),
+                                           extra=analyzer.cache_extra("ltv_fields"))
             ltv_llm = ltv_llm if ltv_llm else [{} for _ in descriptions]
             llm_df = pd.DataFrame(ltv_llm)
             llm_df = llm_df.reindex(range(len(ltv_active))).fillna("")
@@ -288,7 +276,7 @@ def main():
                         ltv_active.at[idx, 'other_details'] = other_details
 
             ltv_table = (
-                ltv_active.groupby('country', as_index=False)
+                ltv_active.groupby('country', as_index=False, observed=True)
                 .agg({
                     'limits': lambda x: ", ".join(sorted(set(", ".join(x.fillna("").astype(str)).split(", ")))) if x.notna().any() else "N/A",
                     'ftb_flag': lambda x: "Yes" if (x == "Yes").any() else "No",
@@ -304,18 +292,16 @@ def main():
                 'other_details': 'OTHER EXCEPTIONS'
             })
 
-        # B) Legutóbbi 10 BBM döntés
-        bbm_decisions = bbm_full.sort_values('date', ascending=False).head(10).copy()
-        cols_bbm_dec = ['date', 'iso2', 'measure_type', 'status', 'description']
-        bbm_decisions = bbm_decisions[[c for c in cols_bbm_dec if c in bbm_decisions.columns]]
-        
+        # B) Legutóbbi 10 BBM döntés (materializált nézet)
         if not bbm_decisions.empty:
             logger.info("   -> BBM AI cleaning (Decisions)...")
             if 'date' in bbm_decisions.columns:
                 bbm_decisions['date'] = pd.to_datetime(bbm_decisions['date']).dt.strftime('%Y-%m-%d')
             
             # AI Tisztítás a leírásra
-            details = analyzer.extract_keywords(bbm_decisions['description'].astype(str).tolist(), "targeted risk or background")
+            details = cache.get_or_compute('enrich:bbm_decisions', lambda: analyzer.extract_keywords(
+                bbm_decisions['description'].astype(str).tolist(), "targeted risk or background"),
+                extra=analyzer.cache_extra("keywords", "targeted risk or background"))
             bbm_decisions['description'] = details
             
             bbm_decisions.columns = [c.upper() for c in bbm_decisions.columns]
@@ -425,17 +411,19 @@ def main():
         return pd.DataFrame(rows)
 
     news_df = fetch_news()
+    cache.register(news=news_df)
     if news_df is not None and not news_df.empty:
         try:
             news_texts = (news_df['TITLE'].fillna('') + " - " + news_df['SUMMARY'].fillna('')).tolist()
-            news_tags = analyzer.classify_news_tags(news_texts)
+            news_tags = cache.get_or_compute('enrich:news_tags', lambda: analyzer.classify_news_tags(news_texts),
+                                             extra=analyzer.cache_extra("news_tags"))
             news_df['TAGS'] = news_tags
         except Exception as exc:
             logger.warning(f"News tag classification failed: {exc}")
         try:
-            summaries = analyzer.summarize_news_items(
+            summaries = cache.get_or_compute('enrich:news_summaries', lambda: analyzer.summarize_news_items(
                 (news_df['TITLE'].fillna('') + ". " + news_df['SUMMARY'].fillna('')).tolist()
-            )
+            ), extra=analyzer.cache_extra("news_summaries"))
             news_df['SUMMARY_SHORT'] = summaries
         except Exception as exc:
             logger.warning(f"News summarization failed: {exc}")
@@ -461,19 +449,19 @@ def main():
         'news_df': news_df,
     }
 
-    analyses = analyzer.run_analysis(analysis_inputs, paths, {})
+    analyses = analyzer.run_analysis(analysis_inputs, paths, {}, cache=cache)
 
     # 3b. Grounded validation against data, charts, and external sources
     if run_grounding:
         logger.info("3b. Grounded Validation...")
-        validator = GroundingValidator(LLM_CONFIG, SEARCH_CONFIG, analyzer._clean_text)
+        validator = GroundingValidator(LLM_CONFIG, SEARCH_CONFIG, analyzer._clean_text, llm_cache, llm_pool)
         analyses = validator.run(analyses, analysis_inputs, data)
     
     # 4. Render
     logger.info("4. Riport...")
     def to_html(df):
         if df is None or df.empty: return "<p class='no-data'>No Data</p>"
-        df_copy = df.copy()
+        df_copy = df.copy(deep=False)
         # Minden szöveges oszlopot kezelünk, de kiemelten a JUSTIFICATION/DETAILS-t
         for col in ['DETAILS', 'REASONS', 'JUSTIFICATION', 'FTB DETAILS', 'OTHER EXCEPTIONS', 'SUMMARY']:
             if col in df_copy.columns:
@@ -625,22 +613,27 @@ def main():
 
     def write_partial(name, html):
         path = partials_dir / f"{name}.html"
-        path.write_text(wrap_partial(html), encoding="utf-8")
+        write_text_if_changed(path, wrap_partial(html))
         return rel_path(path)
 
     def write_plot_html(name, fig):
         if fig is None:
             return ""
-        plot_html = fig.to_html(full_html=True, include_plotlyjs='cdn', config={"responsive": True})
+        # Rögzített div_id: azonos ábrához azonos HTML, így a változatlan fájl nem íródik újra
+        plot_html = fig.to_html(full_html=True, include_plotlyjs='cdn', div_id=name, config={"responsive": True})
         path = plots_dir / f"{name}.html"
-        path.write_text(plot_html, encoding="utf-8")
+        write_text_if_changed(path, plot_html)
         return rel_path(path)
 
     def write_download(name, df):
         if df is None or df.empty:
             return ""
         path = downloads_dir / f"{name}.xlsx"
-        df.to_excel(path, index=False)
+        # A teljes tábla ujjlenyomata is a kulcs része: a trend táblák napi záró sora is frissíti a letöltést
+        extra = (fingerprint(df),)
+        if not cache.fresh_file(f"download:{name}", path, extra):
+            df.to_excel(path, index=False)
+            cache.store(f"download:{name}", str(path), extra)
         return rel_path(path)
 
     table_files = {
@@ -681,6 +674,9 @@ def main():
     )
     
     with open("index.html", "w", encoding="utf-8") as f: f.write(rendered_html)
+    cache.save()
+    llm_cache.close()
+    llm_pool.close()
     logger.info("DONE: index.html")
 
 if __name__ == "__main__":
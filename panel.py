@@ -0,0 +1,135 @@
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from ledger import INSTRUMENTS, country_state
+from utils import read_json, write_json
+
+PANEL_VERSION = 1
+# Mező -> (fájl, dtype); mindkettő (eszköz x ország x nap) C-sorrendű tömb, így egy ország idősora folytonos
+FIELDS = {'value': ('values.npy', np.float32), 'active': ('active.npy', np.bool_)}
+
+DateLike = Union[str, pd.Timestamp, np.datetime64]
+
+
+def write_panel(ledger: pd.DataFrame, directory: Path, today=None, instruments: Optional[Dict[str, dict]] = None) -> Optional[Path]:
+    """
+    Sűrű (eszköz x ország x nap) panel az eseménynaplóból: érték (CCyB / SyRB ráta, BBM aktív intézkedések száma)
+    és aktív jelző, .npy fájlokban (memory map-pel olvasható) + index.json a tengelyekkel és a bájt-offsetekkel.
+    A napok az első eseménytől a mai napig (ill. a legkésőbbi bejelentett hatálybalépésig) tartanak.
+    """
+    instruments = instruments or INSTRUMENTS
+    today = pd.Timestamp(today if today is not None else pd.Timestamp.now()).normalize()
+    states = {name: country_state(ledger, name, instruments=instruments) for name in instruments}
+    states = {name: state for name, state in states.items() if not state[0].empty}
+    if not states: return None
+
+    countries = sorted({c for values, _ in states.values() for c in values.columns})
+    first = min(values.index.min() for values, _ in states.values())
+    last = max([today] + [values.index.max() for values, _ in states.values()])
+    days = pd.date_range(first, last, freq='D')
+    iso2 = ledger.dropna(subset=['iso2']).groupby('country', observed=True)['iso2'].first()
+
+    directory = Path(directory)
+    staging = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    shape = (len(states), len(countries), len(days))
+    arrays = {field: np.lib.format.open_memmap(staging / fname, mode='w+', dtype=dtype, shape=shape)
+              for field, (fname, dtype) in FIELDS.items()}
+    for i, (values, active) in enumerate(states.values()):
+        # Napi állapot: az adott napig utolsó eseménynap sora (előtte 0 / inaktív)
+        pos = np.searchsorted(values.index.to_numpy(), days.to_numpy(), side='right') - 1
+        before = pos < 0
+        cols = pd.Index(countries).get_indexer(values.columns)
+        for field, frame in (('value', values), ('active', active)):
+            daily = frame.to_numpy()[np.clip(pos, 0, None)]
+            daily[before] = 0
+            arrays[field][i, cols, :] = daily.T
+    offsets = {}
+    for field, array in arrays.items():
+        array.flush()
+        offsets[field] = int(array.offset)
+    del arrays
+
+    write_json(staging / 'index.json', {
+        'version': PANEL_VERSION,
+        'as_of': today.strftime('%Y-%m-%d'),
+        'instruments': list(states),
+        'countries': countries,
+        'iso2': [iso2.get(c) for c in countries],
+        'start': days[0].strftime('%Y-%m-%d'),
+        'days': len(days),
+        'shape': list(shape),
+        'order': 'C',
+        'fields': {field: {'file': fname, 'dtype': np.dtype(dtype).str, 'offset': offsets[field]}
+                   for field, (fname, dtype) in FIELDS.items()},
+    })
+    # Csere egy lépésben: a régi fájlokat már megnyitott olvasók a régi inode-ot látják tovább
+    if directory.exists(): shutil.rmtree(directory)
+    staging.rename(directory)
+    return directory
+
+
+class PolicyPanel:
+    """
+    A write_panel által írt panel zero-copy olvasása (np.load(mmap_mode='r')): a szeletelés csak
+    az érintett lapokat olvassa be. A tengelyek az index.json-ban vannak, így R-ből / notebookból
+    a tömb a megadott offsettől nyersen is olvasható (dtype, shape, C-sorrend).
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.index = read_json(self.directory / 'index.json')
+        if self.index.get('version') != PANEL_VERSION:
+            raise FileNotFoundError(f"No policy panel (version {PANEL_VERSION}) in {self.directory}")
+        self.instruments = list(self.index['instruments'])
+        self.countries = pd.Index(self.index['countries'])
+        self.iso2 = pd.Index(self.index['iso2'])
+        self.start = pd.Timestamp(self.index['start'])
+        self.dates = pd.date_range(self.start, periods=self.index['days'], freq='D')
+        self._arrays = {field: np.load(self.directory / spec['file'], mmap_mode='r')
+                        for field, spec in self.index['fields'].items()}
+
+    @classmethod
+    def open(cls, directory: Path) -> Optional['PolicyPanel']:
+        try:
+            return cls(directory)
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def _day(self, date: Optional[DateLike], default: int) -> int:
+        if date is None: return default
+        return int(np.clip((pd.Timestamp(date).normalize() - self.start).days, 0, len(self.dates)))
+
+    def _country_positions(self, countries) -> Union[slice, np.ndarray]:
+        if countries is None: return slice(None)
+        countries = [countries] if isinstance(countries, str) else list(countries)
+        pos = self.countries.get_indexer(countries)
+        # Országnév vagy ISO2 kód is megadható
+        missing = pos < 0
+        pos[missing] = self.iso2.get_indexer(np.asarray(countries, dtype=object)[missing])
+        return pos[pos >= 0]
+
+    def slice(self, instrument: str, field: str = 'value', countries=None,
+              start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> np.ndarray:
+        """(ország x nap) nézet a memory-mapped tömbre; dátum szerint (és ország nélkül) másolás nélkül."""
+        i = self.instruments.index(instrument)
+        stop = self._day(end, 0) + 1 if end is not None else len(self.dates)
+        return self._arrays[field][i, self._country_positions(countries), self._day(start, 0):stop]
+
+    def frame(self, instrument: str, field: str = 'value', countries=None,
+              start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> pd.DataFrame:
+        """Ugyanez DataFrame-ként (index: nap, oszlop: ország)."""
+        data = self.slice(instrument, field, countries, start, end)
+        pos = self._country_positions(countries)
+        first = self._day(start, 0)
+        return pd.DataFrame(np.asarray(data).T, index=self.dates[first:first + data.shape[1]], columns=self.countries[pos])
+
+    def on(self, date: DateLike, instrument: str, field: str = 'value') -> pd.Series:
+        """Keresztmetszet egy adott napon (országonként)."""
+        day = min(self._day(date, 0), len(self.dates) - 1)
+        return pd.Series(np.asarray(self._arrays[field][self.instruments.index(instrument), :, day]), index=self.countries)
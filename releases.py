@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from schema import apply_schema
+from utils import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+# Archivált táblák: a "changed" párosítás kulcsa (ESRB azonosító / ország + döntés napja), és a futás napjától
+# függő, nem archivált oszlopok
+RELEASE_DATASETS = {
+    'syrb_df': {'keys': ['reference'], 'exclude': []},
+    'ccyb_df': {'keys': ['country', 'decision_date'], 'exclude': []},
+    'bbm_df': {'keys': ['Reference of measure'], 'exclude': ['active_status']},
+}
+
+# Azonos tartalmú sorok megkülönböztetése: ujjlenyomat + előfordulás sorszáma * páratlan konstans (mod 2**64)
+_OCCURRENCE_STEP = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _row_keys(fingerprints: pd.Series) -> np.ndarray:
+    fps = fingerprints.to_numpy(dtype=np.uint64)
+    nth = pd.Series(fps).groupby(fps).cumcount().to_numpy(dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        return fps + nth * _OCCURRENCE_STEP
+
+
+class ReleaseArchive:
+    """
+    ESRB kiadások archívuma (data/releases): a forrás munkafüzetek tartalom-hash szerint (sources/), és kiadásonként
+    a processed táblák deltája az előző kiadáshoz képest (<release>/<tábla>.parquet: '_op' = add / remove sorok,
+    '_key' = sor-ujjlenyomat) + a sorrend (<tábla>.order.npy). A legutolsó állapot a head/ mappában van,
+    így egy új kiadás rögzítése nem igényli a régiek visszajátszását.
+    diff(a, b): csak a két kiadás közötti delták beolvasása; snapshot(r): visszajátszás az első kiadástól.
+    """
+
+    def __init__(self, directory: Path, fingerprint: Callable[[pd.DataFrame, str], pd.Series]):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.index_path = self.directory / 'index.json'
+        self.index = read_json(self.index_path, {'releases': []})
+
+    @property
+    def releases(self) -> List[str]:
+        return [r['id'] for r in self.index['releases']]
+
+    def _position(self, release: str) -> int:
+        if release not in self.releases:
+            raise KeyError(f"Unknown release '{release}' (archived: {', '.join(self.releases) or 'none'})")
+        return self.releases.index(release)
+
+    def _archive_sources(self, sources: Dict[str, str], files: Dict[str, Path]) -> Dict[str, str]:
+        archived = {}
+        for key, path in files.items():
+            digest = sources.get(key)
+            if not digest or not Path(path).exists(): continue
+            target = self.directory / 'sources' / f"{Path(path).stem}.{digest[:12]}{Path(path).suffix}"
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path, target)
+            archived[key] = str(target.relative_to(self.directory))
+        return archived
+
+    def record(self, frames: Dict[str, pd.DataFrame], sources: Dict[str, str], files: Dict[str, Path]) -> Optional[str]:
+        """
+        Új kiadás rögzítése, ha a források (sha256) kombinációja még nem szerepel az archívumban.
+        sources: a forrás hash-ek (és az ETL verzió), files: kulcs -> munkafüzet elérési út. Visszatérés: kiadás azonosító.
+        """
+        release = hashlib.sha256("|".join(f"{k}={v}" for k, v in sorted(sources.items())).encode()).hexdigest()[:12]
+        if release in self.releases: return None
+        if any(frames.get(name) is None or frames[name].empty for name in RELEASE_DATASETS):
+            logger.warning(f"Release {release} not archived: a processed table is empty.")
+            return None
+
+        release_dir = self.directory / release
+        release_dir.mkdir(parents=True, exist_ok=True)
+        head_dir = self.directory / 'head'
+        head_dir.mkdir(parents=True, exist_ok=True)
+        datasets = {}
+        for name, spec in RELEASE_DATASETS.items():
+            df = frames[name].drop(columns=[c for c in spec['exclude'] if c in frames[name].columns]).reset_index(drop=True)
+            keys = _row_keys(self.fingerprint(df, name))
+            head_path = head_dir / f"{name}.parquet"
+            head = pd.read_parquet(head_path) if head_path.exists() else pd.DataFrame({'_key': np.array([], dtype=np.uint64)})
+            head_keys = head['_key'].to_numpy(dtype=np.uint64)
+            added = ~np.isin(keys, head_keys)
+            removed = ~np.isin(head_keys, keys)
+            # Üres részek nélkül (változatlan kiadásnál mindkettő üres: a delta csak az oszlopokat tartalmazza)
+            parts = [part for part in (df[added].assign(_op='add', _key=keys[added]), head[removed].assign(_op='remove'))
+                     if not part.empty]
+            delta = pd.concat(parts, ignore_index=True) if parts else df.iloc[:0].assign(_op='add', _key=keys[:0])
+            delta.to_parquet(release_dir / f"{name}.parquet")
+            np.save(release_dir / f"{name}.order.npy", keys)
+            df.assign(_key=keys).to_parquet(head_path)
+            datasets[name] = {'rows': len(df), 'added': int(added.sum()), 'removed': int(removed.sum())}
+
+        entry = {'id': release, 'recorded_at': pd.Timestamp.now().isoformat(timespec='seconds'), 'sources': sources,
+                 'files': self._archive_sources(sources, files), 'datasets': datasets}
+        self.index['releases'].append(entry)
+        write_json(self.index_path, self.index)
+        logger.info(f"  Archived release {release}: " + ", ".join(f"{n} +{d['added']}/-{d['removed']}" for n, d in datasets.items()))
+        return release
+
+    def _deltas(self, releases: List[str], name: str) -> pd.DataFrame:
+        parts = [pd.read_parquet(self.directory / r / f"{name}.parquet").assign(_seq=i) for i, r in enumerate(releases)]
+        # Változatlan kiadások üres deltái nélkül (ha mind üres, az első adja az oszlopokat)
+        parts = [part for part in parts if not part.empty] or parts[:1]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['_key', '_op', '_seq'])
+
+    @staticmethod
+    def _clean(df: pd.DataFrame) -> pd.DataFrame:
+        return apply_schema(df.drop(columns=['_key', '_op', '_seq']).reset_index(drop=True))
+
+    def diff(self, release_a: str, release_b: str, datasets=None) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """
+        Változások release_a -> release_b táblánként: added / removed sorok, és changed (a kulcs szerint egyértelműen
+        párosítható új sorok, 'changed_columns' listával). Csak a két kiadás közötti delták kerülnek beolvasásra.
+        """
+        a, b = self._position(release_a), self._position(release_b)
+        chain = self.releases[min(a, b) + 1:max(a, b) + 1]
+        result = {}
+        for name in datasets or RELEASE_DATASETS:
+            deltas = self._deltas(chain, name)
+            # Soronként (ujjlenyomat) az első és az utolsó művelet dönt: add..add = új, remove..remove = törölt
+            first = deltas.drop_duplicates('_key', keep='first').set_index('_key')
+            last = deltas.drop_duplicates('_key', keep='last').set_index('_key').reindex(first.index)
+            added = last[(first['_op'] == 'add') & (last['_op'] == 'add')].reset_index()
+            removed = first[(first['_op'] == 'remove') & (last['_op'] == 'remove')].reset_index()
+            if a > b: added, removed = removed, added
+            result[name] = self._pair_changes(self._clean(added), self._clean(removed), RELEASE_DATASETS[name]['keys'])
+        return result
+
+    @staticmethod
+    def _pair_changes(added: pd.DataFrame, removed: pd.DataFrame, keys: List[str]) -> Dict[str, pd.DataFrame]:
+        if added.empty or removed.empty or any(k not in added.columns or k not in removed.columns for k in keys):
+            return {'added': added, 'removed': removed, 'changed': added.iloc[:0].assign(changed_columns=pd.Series(dtype=object))}
+        # Csak a mindkét oldalon pontosan egyszer előforduló kulcsok párosíthatók
+        new_keys = added[keys].astype(str).agg('|'.join, axis=1)
+        old_keys = removed[keys].astype(str).agg('|'.join, axis=1)
+        unique = set(new_keys[~new_keys.duplicated(keep=False)]) & set(old_keys[~old_keys.duplicated(keep=False)])
+        is_new, is_old = new_keys.isin(unique), old_keys.isin(unique)
+        changed = added[is_new].set_index(new_keys[is_new])
+        previous = removed[is_old].set_index(old_keys[is_old]).reindex(changed.index)
+        columns = [c for c in changed.columns if c in previous.columns]
+        differs = changed[columns].astype(str).ne(previous[columns].astype(str))
+        changed = changed.assign(changed_columns=[list(np.asarray(columns, dtype=object)[row]) for row in differs.to_numpy()])
+        return {'added': added[~is_new].reset_index(drop=True), 'removed': removed[~is_old].reset_index(drop=True),
+                'changed': changed.reset_index(drop=True)}
+
+    def snapshot(self, release: str, datasets=None) -> Dict[str, pd.DataFrame]:
+        """A processed táblák egy korábbi kiadáskor (a deltákból visszajátszva, az eredeti sorrenddel)."""
+        chain = self.releases[:self._position(release) + 1]
+        frames = {}
+        for name in datasets or RELEASE_DATASETS:
+            deltas = self._deltas(chain, name)
+            rows = deltas[deltas['_op'] == 'add'].drop_duplicates('_key', keep='last').set_index('_key')
+            order = np.load(self.directory / release / f"{name}.order.npy")
+            frames[name] = self._clean(rows.loc[order].reset_index())
+        return frames
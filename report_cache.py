@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Set
+
+import pandas as pd
+
+from utils import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_VERSION = 1
+
+# Adat-artefaktum -> a tőle függő kimenetek (enrich: LLM tisztítás, analysis: LLM elemzés, plot: PNG export,
+# download: xlsx). A fejezet- és a vezetői összefoglalók a bemeneti elemzések szövegétől függenek (extra kulcs),
+# így csak akkor futnak újra, ha valamelyik elemzésük változott. A partial-ok és a plot HTML-ek tartalom szerint íródnak.
+IMPACT_MAP = {
+    'agg_trend': ['plot:ccyb_diffusion', 'download:ccyb_diffusion', 'analysis:ccyb_diffusion_analysis'],
+    'ccyb_history': ['plot:ccyb_timeseries', 'analysis:ccyb_history_analysis'],
+    'latest_ccyb': ['plot:cross_section_map', 'plot:cross_section_bar', 'plot:risk_plot',
+                    'analysis:ccyb_diffusion_analysis', 'analysis:ccyb_history_analysis',
+                    'analysis:ccyb_level_analysis', 'analysis:risk_analysis_text'],
+    'ref_date': ['plot:cross_section_map', 'plot:cross_section_bar'],
+    'ccyb_decisions': ['enrich:ccyb_keywords', 'analysis:ccyb_decisions_analysis'],
+    'syrb_trend': ['plot:syrb_counts_trend', 'analysis:syrb_trend_analysis'],
+    'latest_syrb': ['plot:syrb_sector', 'analysis:syrb_sectoral_analysis'],
+    'active_syrb': ['enrich:syrb_active', 'analysis:syrb_active_analysis'],
+    'syrb_decisions': ['enrich:syrb_decisions', 'analysis:syrb_decisions_analysis'],
+    'active_bbm': ['analysis:bbm_analysis'],
+    'bbm_trend': ['plot:bbm_diffusion', 'download:bbm_diffusion', 'analysis:bbm_diffusion_analysis'],
+    'bbm_decisions': ['enrich:bbm_decisions', 'analysis:bbm_decisions_analysis'],
+    'ltv_measures': ['enrich:ltv_fields', 'analysis:ltv_analysis'],
+    'news': ['enrich:news_tags', 'enrich:news_summaries', 'analysis:news_summary'],
+}
+
+# Kimenet -> artefaktumok (az IMPACT_MAP megfordítása)
+DEPENDENCIES: Dict[str, Set[str]] = {}
+for _artifact, _outputs in IMPACT_MAP.items():
+    for _output in _outputs: DEPENDENCIES.setdefault(_output, set()).add(_artifact)
+
+
+def fingerprint(value: Any) -> str:
+    """Tartalom-ujjlenyomat: DataFrame soronkénti hash-ből (oszlopnevekkel), minden más JSON-ként."""
+    if value is None: return ""
+    if isinstance(value, pd.DataFrame):
+        text = value.astype(object).where(value.notna(), "").astype(str)
+        rows = pd.util.hash_pandas_object(text, index=False).to_numpy()
+        return hashlib.sha256("|".join(map(str, value.columns)).encode() + rows.tobytes()).hexdigest()[:16]
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def has_content(value: Any) -> bool:
+    """Érdemes-e eltárolni egy LLM kimenetet (a hibák / üres válaszok nem kerülnek a cache-be)."""
+    if isinstance(value, str): return bool(value.strip()) and value.strip() not in ("N/A", "Error")
+    if isinstance(value, tuple): return all(has_content(v) for v in value)
+    if isinstance(value, list): return any(has_content(v) for v in value)
+    if isinstance(value, dict): return any(has_content(v) for v in value.values())
+    return value is not None
+
+
+class ReportCache:
+    """
+    A riport kimeneteinek cache-e (data/report_cache.json): minden kimenet kulcsa a függő artefaktumok
+    (IMPACT_MAP) és az extra bemenetek (prompt, adat-szöveg) ujjlenyomata. Változatlan kulcsnál a korábbi
+    kimenet (szöveg / fájl) újrahasznosul, így csak az érintett LLM hívások és Kaleido exportok futnak.
+    """
+
+    def __init__(self, path: Path, enabled: bool = True):
+        self.path = Path(path)
+        self.enabled = enabled
+        state = read_json(self.path) if enabled else {}
+        self.state = state if state.get('version') == REPORT_CACHE_VERSION else {'version': REPORT_CACHE_VERSION, 'outputs': {}}
+        self.previous = dict(self.state.get('artifacts', {}))
+        self.artifacts: Dict[str, str] = {}
+        self.reused, self.computed = [], []
+
+    def register(self, **artifacts):
+        self.artifacts.update({name: fingerprint(value) for name, value in artifacts.items()})
+
+    def changed(self) -> Set[str]:
+        """Az előző futáshoz képest változott artefaktumok."""
+        return {name for name, fp in self.artifacts.items() if self.previous.get(name) != fp}
+
+    def impacted(self, artifacts: Iterable[str]) -> Set[str]:
+        return {output for name in artifacts for output in IMPACT_MAP.get(name, [])}
+
+    def _key(self, output: str, extra: tuple) -> str:
+        deps = [f"{name}={self.artifacts.get(name, '')}" for name in sorted(DEPENDENCIES.get(output, ()))]
+        return fingerprint([output, deps, [fingerprint(e) for e in extra]])
+
+    def lookup(self, output: str, extra: tuple = ()):
+        """(True, érték), ha a kimenet kulcsa nem változott; különben (False, None)."""
+        entry = self.state['outputs'].get(output)
+        if self.enabled and entry and entry.get('key') == self._key(output, extra):
+            self.reused.append(output)
+            return True, entry.get('value')
+        return False, None
+
+    def store(self, output: str, value: Any = None, extra: tuple = ()):
+        self.state['outputs'][output] = {'key': self._key(output, extra), 'value': value}
+        self.computed.append(output)
+
+    def get_or_compute(self, output: str, compute: Callable[[], Any], extra: tuple = (), valid: Callable[[Any], bool] = has_content):
+        hit, value = self.lookup(output, extra)
+        if hit: return value
+        value = compute()
+        if valid(value): self.store(output, value, extra)
+        return value
+
+    def fresh_file(self, output: str, path: Path, extra: tuple = ()) -> bool:
+        """Fájl-kimenet (PNG, xlsx): friss, ha a kulcs nem változott és a fájl megvan."""
+        entry = self.state['outputs'].get(output)
+        if self.enabled and entry and entry.get('key') == self._key(output, extra) and Path(path).exists():
+            self.reused.append(output)
+            return True
+        return False
+
+    def save(self):
+        if not self.enabled: return
+        self.state['artifacts'] = {**self.previous, **self.artifacts}
+        try:
+            write_json(self.path, self.state)
+        except Exception as e:
+            logger.warning(f"Report cache write skipped: {e}")
+        logger.info(f"  Report cache: {len(self.reused)} output(s) reused, {len(self.computed)} regenerated.")
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+# Alacsony kardinalitású azonosító / státusz oszlopok -> category
+CATEGORICAL_COLUMNS = ("country", "iso2", "iso3", "status", "exposure_type", "syrb_type", "measure_type", "active_status")
+DATE_COLUMNS = ("date", "revocation_date", "decision_date")
+
+# Arrow-alapú szöveg NaN hiányzó értékkel: az object oszlophoz hasonlóan viselkedik (astype(str) -> 'nan', bool(NaN) igaz)
+TEXT_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+
+
+def enable_copy_on_write():
+    """Copy-on-write a teljes futásra: a részhalmazok nem másolódnak, amíg nem módosítjuk őket."""
+    pd.set_option("mode.copy_on_write", True)
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Kompakt oszlopos séma a processed táblákra: a CATEGORICAL_COLUMNS category, a dátumok datetime64[ns],
+    a többi tisztán szöveges object oszlop Arrow string. A vegyes típusú oszlopok object-ek maradnak.
+    Parquetből / featherből visszaolvasott táblára is alkalmazható (ott a szövegek újra object-ként jönnek).
+    """
+    if df.empty: return df
+    dtypes, dates = {}, []
+    for col, dtype in df.dtypes.items():
+        if col in CATEGORICAL_COLUMNS:
+            if not isinstance(dtype, pd.CategoricalDtype): dtypes[col] = "category"
+        elif col in DATE_COLUMNS:
+            if dtype != "datetime64[ns]": dates.append(col)
+        elif dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) == "string":
+            dtypes[col] = TEXT_DTYPE
+    if dtypes: df = df.astype(dtypes)
+    if dates: df = df.assign(**{col: pd.to_datetime(df[col], errors='coerce').astype("datetime64[ns]") for col in dates})
+    return df
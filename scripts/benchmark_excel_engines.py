@@ -0,0 +1,101 @@
+"""
+Excel engine benchmark: hideg (cache nélküli) beolvasás a WorkbookReader-rel
+a csomagolt esrb.*.xlsx fájlokon és azok szintetikusan felnagyított másolatain.
+
+Használat:
+    python scripts/benchmark_excel_engines.py --factors 1 5 20 --repeat 3
+"""
+import argparse
+import importlib.util
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from config import FILES  # noqa: E402
+from workbook import EXCEL_ENGINES, WorkbookReader  # noqa: E402
+
+warnings.simplefilter(action='ignore', category=UserWarning)
+
+SOURCES = [FILES["ccyb_source"], FILES["syrb_source"]]
+
+
+def enlarge_workbook(source: Path, factor: int, target_dir: Path) -> Path:
+    """Minden lap adatsorait factor-szor megismétli (a fejléc előtti sorokkal együtt egyszer)."""
+    target = target_dir / f"{source.stem}.x{factor}.xlsx"
+    sheets = pd.read_excel(source, sheet_name=None, header=None, engine="openpyxl")
+    with pd.ExcelWriter(target, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            head, body = df.iloc[:5], df.iloc[5:]
+            pd.concat([head] + [body] * factor, ignore_index=True).to_excel(
+                writer, sheet_name=name, header=False, index=False
+            )
+    return target
+
+
+def time_engine(path: Path, engine: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reader = WorkbookReader(path, engine=engine)
+        for sheet in reader.sheet_names:
+            reader.read_sheet(sheet)
+        reader.close()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_identical(path: Path, engines) -> bool:
+    frames = {}
+    for engine in engines:
+        reader = WorkbookReader(path, engine=engine)
+        frames[engine] = [reader.read_sheet(s) for s in reader.sheet_names]
+        reader.close()
+    first, *rest = engines
+    for engine in rest:
+        for a, b in zip(frames[first], frames[engine]):
+            try:
+                pd.testing.assert_frame_equal(a, b)
+            except AssertionError:
+                return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--factors", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engines = [e for e in EXCEL_ENGINES if e != "calamine" or importlib.util.find_spec("python_calamine")]
+    if len(engines) < len(EXCEL_ENGINES):
+        print("python-calamine is not installed: benchmarking openpyxl only.")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in SOURCES:
+            if not source.exists():
+                print(f"Missing source: {source}")
+                continue
+            for factor in args.factors:
+                path = source if factor == 1 else enlarge_workbook(source, factor, Path(tmp))
+                row = {"file": source.name, "factor": factor, "size_kb": round(path.stat().st_size / 1024)}
+                for engine in engines:
+                    row[f"{engine}_s"] = round(time_engine(path, engine, args.repeat), 3)
+                if "calamine" in engines:
+                    row["speedup"] = round(row["openpyxl_s"] / row["calamine_s"], 2)
+                row["identical"] = check_identical(path, engines)
+                rows.append(row)
+                print(f"  {source.name} x{factor} done")
+
+    print(pd.DataFrame(rows).to_markdown(index=False))
+
+
+if __name__ == "__main__":
+    main()
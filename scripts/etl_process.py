@@ -1,9 +1,9 @@
 import pandas as pd
 import country_converter as coco
-import re
 import requests
 import shutil
 import logging
+import sys
 import warnings
 from pathlib import Path
 
@@ -15,6 +15,9 @@ logger = logging.getLogger("ETL")
 BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data"
 
+sys.path.insert(0, str(BASE_DIR))
+from utils import extract_rates  # noqa: E402
+
 URLS = {
     "syrb": "https://www.esrb.europa.eu/national_policy/shared/pdf/esrb.measures_overview_macroprudential_measures.xlsx",
     "ccyb": "https://www.esrb.europa.eu/national_policy/ccb/shared/data/esrb.ccybd_CCyB_data.xlsx"
@@ -57,13 +60,6 @@ def find_header_row(df, keyword="Country"):
         if any(keyword.lower() in str(val).lower() for val in df.iloc[i].values): return i
     return 0
 
-def extract_rate(text):
-    if pd.isna(text): return 0.0
-    text = str(text).lower().replace(',', '.')
-    matches = re.findall(r'(\d+(?:\.\d+)?)', text)
-    valid = [float(m) for m in matches if not (float(m).is_integer() and 1990 <= float(m) <= 2030) and float(m) <= 50]
-    return max(valid) if valid else 0.0
-
 # --- FELDOLGOZÓK ---
 def process_syrb(file_path):
     if not file_path.exists(): return pd.DataFrame()
@@ -98,13 +94,13 @@ def process_syrb(file_path):
         df['iso2'] = coco.convert(names=df['country'].tolist(), to='iso2', not_found=None)
         
         if 'rate_col' in df.columns:
-            df['rate'] = pd.to_numeric(df['rate_col'], errors='coerce').fillna(df['description'].apply(extract_rate))
+            df['rate'] = pd.to_numeric(df['rate_col'], errors='coerce').fillna(extract_rates(df['description']))
         else:
-            df['rate'] = df['description'].apply(extract_rate)
+            df['rate'] = extract_rates(df['description'])
             
         mask_zero = (df['rate'] == 0) & (df['description'].notna())
         if mask_zero.any():
-            df.loc[mask_zero, 'rate'] = df.loc[mask_zero, 'description'].apply(extract_rate)
+            df.loc[mask_zero, 'rate'] = extract_rates(df.loc[mask_zero, 'description'])
 
         def tag_exp(row):
             t = f"{row.get('exposure_type', '')} {row.get('description', '')}".lower()
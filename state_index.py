@@ -0,0 +1,133 @@
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+DateLike = Union[str, pd.Timestamp, np.datetime64]
+
+# Eszközönként: forrás tábla, a "pozíciót" azonosító kulcsok, az aktivitást jelző érték (>0),
+# és hogy a kulcson belüli következő döntés lezárja-e az előzőt (CCyB/SyRB igen, BBM-nél csak a visszavonás)
+INSTRUMENTS = {
+    'ccyb': {'frame': 'ccyb_df', 'keys': ('country',), 'value': 'rate', 'supersede': True},
+    'syrb': {'frame': 'syrb_df', 'keys': ('country', 'exposure_type'), 'value': 'rate_numeric', 'supersede': True},
+    'bbm': {'frame': 'bbm_df', 'keys': ('country', 'measure_type'), 'value': None, 'supersede': False},
+}
+
+# Kulcsonkénti eltolás másodpercben (2**33 s ~ 272 év): kód * _STRIDE + idő egyetlen rendezett tömbben
+_STRIDE = np.int64(2 ** 33)
+_OPEN_END = np.iinfo(np.int64).max
+
+
+def _seconds(values) -> np.ndarray:
+    return pd.DatetimeIndex(values).asi8 // 10 ** 9
+
+
+class _InstrumentIndex:
+    """Egy eszköz döntéstörténete kulcs + dátum szerint rendezve, érvényességi intervallumokkal."""
+
+    def __init__(self, df: pd.DataFrame, keys: Sequence[str], value: Optional[str], supersede: bool):
+        df = df.dropna(subset=['date', *keys])
+        df = df.sort_values([*keys, 'date'], kind='stable').reset_index(drop=True)
+        grouped = df.groupby(list(keys), sort=False, observed=True)
+        self.frame = df
+        self.keys = list(keys)
+        self.codes = grouped.ngroup().to_numpy(np.int64)
+        self.groups = df.loc[~pd.Series(self.codes).duplicated().to_numpy(), self.keys].reset_index(drop=True)
+        self.all_codes = np.arange(len(self.groups), dtype=np.int64)
+
+        start = _seconds(df['date'])
+        self.origin = start.min() if len(start) else 0
+        self.composite = self.codes * _STRIDE + (start - self.origin)
+
+        # Érvényesség vége: a kulcs következő döntése és/vagy a visszavonás dátuma (nyitott: _OPEN_END)
+        end = np.full(len(df), _OPEN_END, dtype=np.int64)
+        if supersede and len(df):
+            same_group = np.append(self.codes[1:] == self.codes[:-1], False)
+            end[same_group] = np.append(start[1:], 0)[same_group]
+        if 'revocation_date' in df.columns:
+            revoked = df['revocation_date'].notna().to_numpy()
+            end[revoked] = np.minimum(end[revoked], _seconds(df['revocation_date'][revoked]))
+        self.end_seconds = end
+        self.frame = df.assign(valid_to=pd.to_datetime(np.where(end == _OPEN_END, np.iinfo(np.int64).min, end * 10 ** 9)))
+
+        # Aktív intervallumok kezdet és vég szerint rendezve (active_between)
+        active = np.ones(len(df), dtype=bool) if value is None else (df[value].fillna(0) > 0).to_numpy()
+        self.active_rows = np.flatnonzero(active & (end > start))
+        self.by_start = self.active_rows[np.argsort(start[self.active_rows], kind='stable')]
+        self.sorted_starts = start[self.by_start]
+        self.by_end = self.active_rows[np.argsort(end[self.active_rows], kind='stable')]
+        self.sorted_ends = end[self.by_end]
+        self.start_seconds = start
+
+    def group_codes(self, country: Optional[str]) -> np.ndarray:
+        if country is None: return self.all_codes
+        match = self.groups['country'].astype(str) == country
+        if not match.any() and 'iso2' in self.frame.columns:
+            names = self.frame.loc[self.frame['iso2'].astype(str) == country, 'country'].astype(str).unique()
+            match = self.groups['country'].astype(str).isin(names)
+        return np.flatnonzero(match.to_numpy()).astype(np.int64)
+
+    def _rows(self, rows: np.ndarray, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        frame = self.frame if columns is None else self.frame[list(columns)]
+        return frame.take(rows).set_axis(pd.RangeIndex(len(rows)))
+
+    def state_as_of(self, date: DateLike, country: Optional[str] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        codes = self.group_codes(country)
+        if not len(codes) or not len(self.frame): return self._rows(codes[:0], columns)
+        at = _seconds([pd.Timestamp(date)])[0]
+        offset = np.clip(at - self.origin, -1, _STRIDE - 1)
+        pos = np.searchsorted(self.composite, codes * _STRIDE + offset, side='right') - 1
+        found = pos >= 0
+        found[found] = self.codes[pos[found]] == codes[found]
+        # Csak a t-kor még hatályos döntés (valid_to > t vagy nyitott), mint az active_between-ben
+        pos = pos[found]
+        return self._rows(pos[self.end_seconds[pos] > at], columns)
+
+    def active_between(self, start: DateLike, end: DateLike, country: Optional[str] = None,
+                       columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        start_s, end_s = _seconds([pd.Timestamp(start), pd.Timestamp(end)])
+        # Átfed [start, end]-del: a kezdete <= end, és nem ért véget start-ig (vége > start)
+        begun = self.by_start[:np.searchsorted(self.sorted_starts, end_s, side='right')]
+        ended = self.by_end[:np.searchsorted(self.sorted_ends, start_s, side='right')]
+        rows = np.sort(np.setdiff1d(begun, ended, assume_unique=True))
+        if country is not None:
+            rows = rows[np.isin(self.codes[rows], self.group_codes(country))]
+        return self._rows(rows, columns)
+
+
+class StateIndex:
+    """
+    Időpont szerinti ("as of") lekérdezések a döntéstörténetekre, futásonként egyszer felépítve.
+    state_as_of: kulcsonként (pl. ország / ország + kitettség) az adott napon érvényes utolsó döntés (a visszavont,
+    ill. lezárt döntésű kulcsok kimaradnak),
+    egyetlen np.searchsorted hívással a (kulcs, dátum) szerint rendezett tömbön.
+    active_between: az adott időszakkal átfedő aktív (pozitív rátájú, ill. vissza nem vont) intézkedések,
+    kezdet és vég szerint rendezett tömbökön bináris kereséssel.
+    Az eredmény a forrássorokat adja vissza egy valid_to oszloppal (NaT: nyitott végű).
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame], instruments: Optional[Dict[str, dict]] = None):
+        self._indexes: Dict[str, _InstrumentIndex] = {}
+        for name, spec in (instruments or INSTRUMENTS).items():
+            df = frames.get(spec['frame'])
+            if df is None or df.empty or any(c not in df.columns for c in ('date', *spec['keys'])): continue
+            self._indexes[name] = _InstrumentIndex(df, spec['keys'], spec['value'], spec['supersede'])
+
+    @property
+    def instruments(self) -> Sequence[str]:
+        return list(self._indexes)
+
+    def _index(self, instrument: str) -> _InstrumentIndex:
+        if instrument not in self._indexes:
+            raise KeyError(f"No state index for instrument '{instrument}' (available: {', '.join(self._indexes)})")
+        return self._indexes[instrument]
+
+    def state_as_of(self, date: DateLike, country: Optional[str] = None, instrument: str = 'ccyb',
+                    columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Az adott napon érvényes állapot kulcsonként (country: országnév vagy ISO2 kód; columns: csak ezek az oszlopok)."""
+        return self._index(instrument).state_as_of(date, country, columns)
+
+    def active_between(self, start: DateLike, end: DateLike, instrument: str = 'ccyb',
+                       country: Optional[str] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """A [start, end] időszak bármely pontján aktív intézkedések."""
+        return self._index(instrument).active_between(start, end, country, columns)
@@ -0,0 +1,84 @@
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+DateLike = Union[str, pd.Timestamp, np.datetime64]
+
+
+class StepSeries:
+    """
+    Lépcsős (jobbról folytonos) idősor: csak azokat a dátumokat tárolja, ahol valamelyik érték
+    változik. Minden érték a következő változási pontig (ill. az `end` dátumig) érvényes.
+    Több oszlopot is hordozhat (pl. General / Sectoral SyRB), közös változási pontokkal.
+    """
+
+    def __init__(self, points: pd.DataFrame, end: Optional[DateLike] = None, fill_value=0):
+        points = points.sort_index()
+        # Csak a tényleges változások maradnak meg
+        changed = points.ne(points.shift()).any(axis=1)
+        self.points = points[changed]
+        self.end = pd.Timestamp(end) if end is not None else (self.points.index.max() if len(self.points) else None)
+        self.fill_value = fill_value
+
+    @classmethod
+    def from_series(cls, series: pd.Series, name: Optional[str] = None, end: Optional[DateLike] = None, fill_value=0):
+        return cls(series.to_frame(name or series.name or "value"), end=end, fill_value=fill_value)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, date_col: str = "date", end: Optional[DateLike] = None, fill_value=0):
+        """Kompakt (vagy sűrű) DataFrame-ből, pl. egy korábban mentett trend táblából."""
+        if df is None or df.empty: return cls(pd.DataFrame(index=pd.DatetimeIndex([])), end=end, fill_value=fill_value)
+        points = df.set_index(pd.DatetimeIndex(df[date_col])).drop(columns=[date_col])
+        return cls(points, end=end or points.index.max(), fill_value=fill_value)
+
+    @property
+    def columns(self) -> Sequence[str]:
+        return list(self.points.columns)
+
+    @property
+    def empty(self) -> bool:
+        return self.points.empty
+
+    def __len__(self):
+        return len(self.points)
+
+    def value_at(self, date: Union[DateLike, Sequence[DateLike]], column: Optional[str] = None):
+        """Érték(ek) egy adott napon, bináris kereséssel (a kezdet előtt fill_value)."""
+        dates = pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(date)))
+        pos = self.points.index.searchsorted(dates, side="right") - 1
+        cols = [column] if column else self.columns
+        values = self.points[cols].to_numpy()
+        if len(values):
+            out = values[np.clip(pos, 0, None)]
+            out[pos < 0] = self.fill_value
+        else:
+            out = np.full((len(dates), len(cols)), self.fill_value)
+        result = pd.DataFrame(out, index=dates, columns=cols)
+        if np.ndim(date) == 0:
+            return result.iloc[0, 0] if column or len(cols) == 1 else result.iloc[0]
+        return result[column] if column else result
+
+    def densify(self, freq: str = "D", end: Optional[DateLike] = None) -> pd.DataFrame:
+        """Sűrű rács a kezdőponttól az `end`-ig (alapból napi)."""
+        if self.empty: return pd.DataFrame(columns=self.columns)
+        end = pd.Timestamp(end) if end is not None else self.end
+        grid = pd.date_range(start=self.points.index.min(), end=end, freq=freq)
+        return self.points.reindex(self.points.index.union(grid)).ffill().reindex(grid)
+
+    def resample(self, freq: str = "ME", end: Optional[DateLike] = None) -> pd.DataFrame:
+        """Időszak végi értékek (pl. 'ME' havi, 'QE' negyedéves), sűrítés nélkül."""
+        if self.empty: return pd.DataFrame(columns=self.columns)
+        end = pd.Timestamp(end) if end is not None else self.end
+        grid = pd.date_range(start=self.points.index.min(), end=end, freq=freq)
+        return self.value_at(grid)
+
+    def to_frame(self, date_col: str = "date", date_first: bool = True) -> pd.DataFrame:
+        """Kompakt tábla: változási pontok + egy záró sor az `end` dátummal (hogy az ábra odáig érjen)."""
+        points = self.points
+        if self.end is not None and len(points) and self.end > points.index.max():
+            points = pd.concat([points, points.iloc[[-1]].set_axis([self.end])])
+        df = points.rename_axis(date_col).reset_index()
+        if not date_first:
+            df = df[self.columns + [date_col]]
+        return df
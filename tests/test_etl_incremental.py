@@ -0,0 +1,56 @@
+import shutil
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import config
+import etl
+from etl import ETLPipeline
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """Pipeline a csomagolt munkafüzetek másolatán: minden kimenet tmp_path-ba kerül, letöltés nincs."""
+    for key, path in config.FILES.items():
+        monkeypatch.setitem(config.FILES, key, tmp_path / path.name)
+    for key in ("syrb_source", "ccyb_source", "country_codes"):
+        shutil.copy2(config.DATA_DIR / config.FILES[key].name, config.FILES[key])
+    # Az első futás is openpyxl-lel mentett munkafüzetet olvas, így a két futás között csak a szándékolt szerkesztés tér el
+    for key in ("syrb_source", "ccyb_source"):
+        openpyxl.load_workbook(config.FILES[key]).save(config.FILES[key])
+    monkeypatch.setattr(etl, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(etl, "download_file_safely", lambda url, target: "failed")
+    return ETLPipeline(tmp_path, config.URLS["ccyb"], config.URLS["syrb"], incremental=True, workers=1)
+
+
+def _edit_sources():
+    # CCyB: egy ráta és egy ország módosul, egy sor törlődik; SyRB / BBM: az utolsó sor törlődik
+    wb = openpyxl.load_workbook(config.FILES["ccyb_source"])
+    ws = wb.worksheets[0]
+    header = [c.value for c in ws[1]]
+    ws.cell(row=3, column=header.index('CCyB rate') + 1, value=1.5)
+    ws.cell(row=4, column=header.index('Country') + 1, value='Czech Republic')
+    ws.delete_rows(6)
+    wb.save(config.FILES["ccyb_source"])
+
+    wb = openpyxl.load_workbook(config.FILES["syrb_source"])
+    for name in ('SRB', 'BoBM'):
+        wb[name].delete_rows(wb[name].max_row)
+    wb.save(config.FILES["syrb_source"])
+
+
+def test_incremental_run_matches_full_refresh(pipeline):
+    first = pipeline.run_pipeline()
+    _edit_sources()
+    incremental = pipeline.run_pipeline()
+    full = pipeline.run_pipeline(force=True)
+    # A force csak az adott futásra szól
+    assert pipeline.incremental
+
+    assert len(incremental['ccyb_df']) == len(first['ccyb_df']) - 1
+    assert len(incremental['syrb_df']) < len(first['syrb_df']) and len(incremental['bbm_df']) == len(first['bbm_df']) - 1
+    frames = [name for name, df in full.items() if isinstance(df, pd.DataFrame)]
+    assert {'ccyb_df', 'syrb_df', 'bbm_df', 'agg_trend_df', 'latest_ccyb_df'} <= set(frames)
+    for name in frames:
+        pd.testing.assert_frame_equal(incremental[name], full[name], obj=name)
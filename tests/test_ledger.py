@@ -0,0 +1,118 @@
+import pandas as pd
+
+from ledger import build_ledger, diffusion, diffusion_breakdowns, latest_state
+from step_series import StepSeries
+
+TODAY = pd.Timestamp('2025-01-01')
+
+
+def _breakdown(result, breakdown, group):
+    rows = result[(result['breakdown'] == breakdown) & (result['group'] == group)]
+    return dict(zip(rows['date'].dt.strftime('%Y-%m-%d'), rows['n_countries']))
+
+
+def _ccyb():
+    return pd.DataFrame({
+        'country': ['Croatia', 'Croatia', 'Denmark', 'Denmark', 'Sweden'],
+        'iso2': ['HR', 'HR', 'DK', 'DK', 'SE'],
+        'date': pd.to_datetime(['2020-03-01', '2024-06-01', '2019-09-30', '2020-03-12', '2021-01-01']),
+        'rate': [1.0, 1.5, 1.0, 0.0, 2.0],
+    })
+
+
+def _bbm():
+    return pd.DataFrame({
+        'country': ['Austria', 'Austria', 'Belgium', 'Belgium'],
+        'iso2': ['AT', 'AT', 'BE', 'BE'],
+        'measure_type': ['LTV', 'DSTI', 'LTV', 'DSTI'],
+        'date': pd.to_datetime(['2020-01-01', '2021-01-01', '2019-06-01', '2019-06-01']),
+        'revocation_date': pd.to_datetime(['2023-07-01', None, '2022-01-01', '2022-01-01']),
+    })
+
+
+def test_syrb_same_day_revoke_and_new_measure_stays_active():
+    # Norvégia 2020-12-31: a régi intézkedés visszavonása és az új aznapi hatálybalépése (same_day='max')
+    syrb = pd.DataFrame({
+        'country': ['Norway', 'Norway', 'Norway'],
+        'iso2': ['NO', 'NO', 'NO'],
+        'syrb_type': ['General', 'General', 'General'],
+        'exposure_type': ['Domestic', 'Domestic', 'Domestic'],
+        'date': pd.to_datetime(['2019-12-31', '2020-12-31', '2020-12-31']),
+        'rate_numeric': [3.0, 4.5, 0.0],
+        'status': ['Active', 'Active', 'Revoked'],
+    })
+    ledger = build_ledger({'syrb_df': syrb})
+    assert ledger['event_type'].astype(str).tolist() == ['decision', 'decision', 'revocation']
+
+    counts = diffusion(ledger, 'syrb')
+    assert counts['General'].tolist() == [1]
+    state = latest_state(ledger)
+    assert state['value'].tolist() == [4.5] and state['active'].tolist() == [True]
+
+
+def test_ccyb_same_day_uses_latest_decision():
+    # Azonos hatálybalépési nap: a későbbi döntés (decision_date) számít, a forrás sorrendjétől függetlenül
+    ccyb = pd.DataFrame({
+        'country': ['Ireland', 'Ireland'],
+        'iso2': ['IE', 'IE'],
+        'date': pd.to_datetime(['2020-04-01', '2020-04-01']),
+        'decision_date': pd.to_datetime(['2020-03-18', '2019-07-05']),
+        'rate': [0.0, 1.0],
+    })
+    ledger = build_ledger({'ccyb_df': ccyb})
+    assert latest_state(ledger)['value'].tolist() == [0.0]
+    assert diffusion(ledger, 'ccyb').tolist() == [0]
+
+
+def test_bbm_activation_and_revocation_counts():
+    ledger = build_ledger({'bbm_df': _bbm()})
+    assert ledger['event_type'].value_counts().to_dict() == {'activation': 4, 'revocation': 3}
+
+    counts = diffusion(ledger, 'bbm')
+    # Ausztria a DSTI miatt az LTV visszavonása után is aktív marad; Belgium 2022-ben mindkettőt visszavonja
+    assert dict(zip(counts.index.strftime('%Y-%m-%d'), counts)) == {'2019-06-01': 1, '2020-01-01': 2, '2022-01-01': 1}
+
+    state = latest_state(ledger).set_index(['country', 'sub_type'])['value']
+    assert state.to_dict() == {('Austria', 'DSTI'): 1, ('Austria', 'LTV'): 0, ('Belgium', 'DSTI'): 0, ('Belgium', 'LTV'): 0}
+
+
+def test_euro_area_membership_by_date():
+    # Horvátország 2023-01-01-jén csatlakozik: aznap vált át, akkor is, ha aznap nincs esemény
+    result = diffusion_breakdowns(build_ledger({'ccyb_df': _ccyb()}), TODAY, breakdowns=('euro_area',),
+                                  euro_area={'HR': '2023-01-01'})
+    assert _breakdown(result, 'euro_area', 'Euro area') == {'2019-09-30': 0, '2023-01-01': 1}
+    assert _breakdown(result, 'euro_area', 'Non-euro area') == {
+        '2019-09-30': 1, '2020-03-01': 2, '2020-03-12': 1, '2021-01-01': 2, '2023-01-01': 1}
+
+
+def test_rate_band_grouping():
+    result = diffusion_breakdowns(build_ledger({'ccyb_df': _ccyb()}), TODAY, breakdowns=('rate',))
+    final = result.sort_values('date').groupby('group', observed=True)['n_countries'].last().to_dict()
+    # Utolsó állapot: HR 1.5%, DK 0%, SE 2%
+    assert final == {'>= 0.5%': 2, '>= 1%': 2, '>= 2%': 1}
+    assert _breakdown(result, 'rate', '>= 2%') == {'2019-09-30': 0, '2021-01-01': 1}
+
+
+def _previous_ccyb_trend(df, today):
+    # A korábbi (napi rácsos) CCyB trend: ffill-elt ráták, > 0.0001 országok száma
+    pivot = df.pivot_table(index='date', columns='country', values='rate', aggfunc='last')
+    filled = pivot.reindex(pd.date_range(pivot.index.min(), today, freq='D')).ffill().fillna(0)
+    return (filled > 0.0001).sum(axis=1)
+
+
+def _previous_bbm_trend(df, today):
+    # A korábbi BBM trend: aktiválás +1 / visszavonás -1 országonként, aktív, ha az egyenleg > 0
+    events = pd.concat([df[['date', 'country']].assign(change=1),
+                        df.dropna(subset=['revocation_date'])[['revocation_date', 'country']]
+                        .rename(columns={'revocation_date': 'date'}).assign(change=-1)])
+    dates = pd.date_range(events['date'].min(), today, freq='D')
+    balance = events.pivot_table(index='date', columns='country', values='change', aggfunc='sum')
+    return (balance.reindex(dates).fillna(0).cumsum() > 0).sum(axis=1)
+
+
+def test_ccyb_and_bbm_diffusion_densify_to_previous_trend():
+    for instrument, frame, previous in (('ccyb', _ccyb(), _previous_ccyb_trend), ('bbm', _bbm(), _previous_bbm_trend)):
+        counts = diffusion(build_ledger({f'{instrument}_df': frame}), instrument, TODAY)
+        dense = StepSeries.from_series(counts, 'n', end=TODAY).densify()['n']
+        expected = previous(frame, TODAY)
+        pd.testing.assert_series_equal(dense.astype('int64'), expected.astype('int64'), check_names=False, check_freq=False)
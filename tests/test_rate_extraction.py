@@ -0,0 +1,57 @@
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import FILES
+from utils import extract_rates
+
+# Kézi szélsőesetek a munkafüzet cellái mellé
+EDGE_CASES = [None, np.nan, "", 2.5, 1e-05, 2019, "rate of 3,5", "Rate is 2 (150%)", "150 %", "1.5% from 2019, then 2 %"]
+
+
+def legacy_extract_rate(text):
+    # utils.extract_rate / scripts/etl_process.extract_rate
+    if pd.isna(text): return 0.0
+    text_str = str(text).lower().replace(',', '.')
+    valid = []
+    for m in re.findall(r'(\d+(?:\.\d+)?)', text_str):
+        val = float(m)
+        if (val.is_integer() and 1990 <= val <= 2030) or val > 50: continue
+        valid.append(val)
+    return max(valid) if valid else 0.0
+
+
+def legacy_extract_percent(text):
+    # ETLPipeline._extract_rate_from_text
+    if pd.isna(text): return 0.0
+    text = str(text).replace(',', '.')
+    matches = re.findall(r'(\d+(?:\.\d+)?)\s*%', text)
+    if not matches:
+        matches = re.findall(r'rate\s*(?:of|is)\s*(\d+(?:\.\d+)?)', text, re.IGNORECASE)
+    if matches:
+        rates = [float(r) for r in matches if float(r) <= 100.0]
+        return max(rates) if rates else 0.0
+    return 0.0
+
+
+@pytest.fixture(scope="module")
+def cells():
+    """A csomagolt esrb.*.xlsx munkafüzetek összes (nem üres) cellája + a kézi szélsőesetek."""
+    parts = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for source in (FILES["ccyb_source"], FILES["syrb_source"]):
+            assert source.exists(), f"Missing bundled workbook: {source}"
+            parts.extend(df.stack() for df in pd.read_excel(source, sheet_name=None, header=None).values())
+    parts.append(pd.Series(EDGE_CASES, dtype=object))
+    return pd.concat(parts, ignore_index=True)
+
+
+@pytest.mark.parametrize("legacy, percent", [(legacy_extract_rate, False), (legacy_extract_percent, True)])
+def test_extract_rates_matches_legacy(cells, legacy, percent):
+    expected = cells.map(legacy).to_numpy(dtype=float)
+    np.testing.assert_array_equal(extract_rates(cells, percent=percent).to_numpy(), expected)
+    assert (expected != 0).any()
@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from etl import row_fingerprints
+from releases import ReleaseArchive
+from schema import apply_schema
+
+
+def _syrb(rows):
+    return pd.DataFrame(rows, columns=['reference', 'country', 'rate_numeric', 'date']).assign(
+        date=lambda df: pd.to_datetime(df['date']))
+
+
+def _frames(syrb, active_status='Active'):
+    return {
+        'syrb_df': _syrb(syrb),
+        'ccyb_df': pd.DataFrame({'country': ['Denmark', 'Sweden'], 'rate': [2.5, 2.0],
+                                 'decision_date': pd.to_datetime(['2022-06-30', '2022-06-22'])}),
+        'bbm_df': pd.DataFrame({'Reference of measure': ['M1', 'M2'], 'country': ['Austria', 'Belgium'],
+                                'measure_type': ['LTV', 'DSTI'], 'active_status': [active_status, 'Active']}),
+    }
+
+
+R1 = [('S1', 'Norway', 3.0, '2020-12-31'), ('S2', 'Croatia', 1.5, '2017-08-17')]
+# S1 rátája változik, S2 törlődik, S3 kétszer (azonos tartalommal) érkezik
+R2 = [('S1', 'Norway', 4.5, '2020-12-31'), ('S3', 'Belgium', 9.0, '2024-04-01'), ('S3', 'Belgium', 9.0, '2024-04-01')]
+# Az S3 egyik példánya eltűnik
+R3 = [('S1', 'Norway', 4.5, '2020-12-31'), ('S3', 'Belgium', 9.0, '2024-04-01')]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ReleaseArchive(tmp_path / 'releases', row_fingerprints)
+    recorded = {}
+    # Az utolsó kiadás csak a futásfüggő (nem archivált) active_status oszlopban tér el
+    for i, frames in enumerate([_frames(R1), _frames(R2), _frames(R3), _frames(R3, active_status='Inactive')]):
+        release = archive.record(frames, {'syrb_source': f'hash{i}'}, {})
+        assert release is not None
+        recorded[release] = frames
+    return archive, recorded
+
+
+def _refs(df):
+    return sorted(df['reference'].astype(str))
+
+
+def test_diff_added_removed_changed_and_inverse(archive):
+    archive, _ = archive
+    r1, r2, r3, r4 = archive.releases
+
+    forward = archive.diff(r1, r2)['syrb_df']
+    assert _refs(forward['added']) == ['S3', 'S3']
+    assert _refs(forward['removed']) == ['S2']
+    assert _refs(forward['changed']) == ['S1']
+    assert forward['changed']['rate_numeric'].tolist() == [4.5]
+    assert forward['changed']['changed_columns'].tolist() == [['rate_numeric']]
+
+    backward = archive.diff(r2, r1)['syrb_df']
+    assert _refs(backward['added']) == ['S2']
+    assert _refs(backward['removed']) == ['S3', 'S3']
+    assert backward['changed']['rate_numeric'].tolist() == [3.0]
+    assert backward['changed']['changed_columns'].tolist() == [['rate_numeric']]
+
+    # Duplikált sor: csak az egyik példány törlődik
+    dropped = archive.diff(r2, r3)['syrb_df']
+    assert _refs(dropped['removed']) == ['S3'] and dropped['added'].empty and dropped['changed'].empty
+    # Első / utolsó művelet összevonása: az r2-ben hozzáadott, r3-ban törölt példány nem jelenik meg
+    assert _refs(archive.diff(r1, r3)['syrb_df']['added']) == ['S3']
+
+    for name in ('ccyb_df', 'bbm_df'):
+        assert all(archive.diff(r1, r3)[name][part].empty for part in ('added', 'removed', 'changed'))
+
+
+def test_unchanged_release_gives_empty_diff(archive):
+    archive, _ = archive
+    r3, r4 = archive.releases[2:]
+    for name, changes in archive.diff(r3, r4).items():
+        assert all(changes[part].empty for part in ('added', 'removed', 'changed')), name
+
+
+def test_snapshot_replays_recorded_frames(archive):
+    archive, recorded = archive
+    for release, frames in recorded.items():
+        snapshot = archive.snapshot(release)
+        for name, df in frames.items():
+            expected = apply_schema(df.drop(columns=['active_status'], errors='ignore'))
+            pd.testing.assert_frame_equal(snapshot[name], expected, check_dtype=False)
+
+
+def test_rerecording_known_sources_is_skipped(archive):
+    archive, _ = archive
+    assert archive.record(_frames(R1), {'syrb_source': 'hash0'}, {}) is None
+    assert len(archive.releases) == 4
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from state_index import StateIndex
+
+
+def _bbm():
+    return pd.DataFrame({
+        'country': ['Austria', 'Austria', 'Belgium'],
+        'iso2': ['AT', 'AT', 'BE'],
+        'measure_type': ['LTV', 'DSTI', 'LTV'],
+        'date': pd.to_datetime(['2020-01-01', '2021-01-01', '2019-06-01']),
+        'revocation_date': pd.to_datetime(['2023-07-01', None, None]),
+    })
+
+
+def test_revoked_bbm_measure_not_in_force_after_revocation():
+    index = StateIndex({'bbm_df': _bbm()})
+
+    before = index.state_as_of('2023-06-30', instrument='bbm')
+    assert set(zip(before['country'], before['measure_type'])) == {('Austria', 'LTV'), ('Austria', 'DSTI'), ('Belgium', 'LTV')}
+
+    after = index.state_as_of('2023-07-01', instrument='bbm')
+    assert set(zip(after['country'], after['measure_type'])) == {('Austria', 'DSTI'), ('Belgium', 'LTV')}
+    assert index.state_as_of('2024-01-01', 'AT', instrument='bbm')['measure_type'].tolist() == ['DSTI']
+
+
+def test_state_as_of_agrees_with_active_between():
+    index = StateIndex({'bbm_df': _bbm()})
+    for day in ['2019-01-01', '2020-06-01', '2023-06-30', '2023-07-01', '2025-01-01']:
+        state = index.state_as_of(day, instrument='bbm')
+        active = index.active_between(day, day, instrument='bbm')
+        assert sorted(zip(state['country'], state['measure_type'])) == sorted(zip(active['country'], active['measure_type']))
@@ -1,7 +1,10 @@
+import numpy as np
 import pandas as pd
 import re
 import io
 import base64
+import hashlib
+import json
 import os
 import sys
 import requests
@@ -45,41 +48,121 @@ def SuppressOutput():
 def ensure_dirs(*dirs: Path):
     for d in dirs: d.mkdir(parents=True, exist_ok=True)
 
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''): h.update(chunk)
+    return h.hexdigest()
+
+def read_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except Exception:
+        return {} if default is None else default
+
+def write_json(path, payload):
+    temp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f: json.dump(payload, f, ensure_ascii=False, indent=2)
+    shutil.move(temp_path, path)
+
+def write_text_if_changed(path, text):
+    """Csak akkor ír, ha a tartalom változott (a változatlan fájl mtime-ja megmarad). Visszatérés: írt-e."""
+    if path.exists() and path.read_text(encoding='utf-8') == text: return False
+    path.write_text(text, encoding='utf-8')
+    return True
+
+def download_meta_path(target_path):
+    return target_path.with_name(target_path.name + '.meta.json')
+
 def download_file_safely(url, target_path):
+    """
+    Feltételes letöltés (If-None-Match / If-Modified-Since) SHA-256 ellenőrzéssel.
+    Visszatérés: "updated", "not_modified" vagy "failed" (ilyenkor a meglévő fájl marad).
+    """
     print(f"  Downloading: {target_path.name}...")
     temp_path = target_path.with_suffix('.tmp')
+    meta_path = download_meta_path(target_path)
+    meta = read_json(meta_path) if target_path.exists() else {}
     headers = {'User-Agent': 'Mozilla/5.0'}
+    if meta.get('etag'): headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'): headers['If-Modified-Since'] = meta['last_modified']
     try:
         r = requests.get(url, headers=headers, timeout=60)
+        if r.status_code == 304:
+            print(f"  Not modified: {target_path.name}")
+            return "not_modified"
         r.raise_for_status()
+        digest = hashlib.sha256(r.content).hexdigest()
+        new_meta = {
+            'url': url,
+            'etag': r.headers.get('ETag'),
+            'last_modified': r.headers.get('Last-Modified'),
+            'sha256': digest,
+        }
+        # A szerver nem mindig támogatja a validátorokat: a tartalom hash dönt
+        if target_path.exists() and digest == (meta.get('sha256') or file_sha256(target_path)):
+            write_json(meta_path, new_meta)
+            print(f"  Not modified (same content): {target_path.name}")
+            return "not_modified"
         with open(temp_path, 'wb') as f: f.write(r.content)
         if temp_path.stat().st_size < 1000: raise ValueError("Túl kicsi fájl")
         shutil.move(temp_path, target_path)
-        return True
+        write_json(meta_path, new_meta)
+        return "updated"
     except Exception as e:
         print(f"  Download error ({e}). Using existing file.")
         if temp_path.exists(): temp_path.unlink()
-        return False
+        return "failed"
 
 def clean_columns(df):
     df.columns = df.columns.astype(str).str.strip().str.replace('\n', ' ').str.replace('  ', ' ')
     return df
 
-def find_header_row(df, keyword="Country"):
-    for i in range(min(20, len(df))):
-        if any(keyword.lower() in str(val).lower() for val in df.iloc[i].values): return i
+def find_header_row(df, keyword="Country", max_rows=20):
+    keywords = [keyword.lower()] if isinstance(keyword, str) else [k.lower() for k in keyword]
+    for i in range(min(max_rows, len(df))):
+        if any(k in str(val).lower() for val in df.iloc[i].values for k in keywords): return i
     return 0
 
-def extract_rate(text):
-    if pd.isna(text): return 0.0
-    text_str = str(text).lower().replace(',', '.')
-    matches = re.findall(r'(\d+(?:\.\d+)?)', text_str)
-    valid_rates = []
-    for m in matches:
-        val = float(m)
-        if (val.is_integer() and 1990 <= val <= 2030) or val > 50: continue
-        valid_rates.append(val)
-    return max(valid_rates) if valid_rates else 0.0
+_RATE_NUMBER = re.compile(r'(\d+(?:\.\d+)?)')
+_RATE_PERCENT = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+_RATE_PHRASE = re.compile(r'rate\s*(?:of|is)\s*(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+def _rate_matches(text, pattern):
+    """Összes találat pozíció (sor sorszáma) + érték tömbként."""
+    m = text.str.extractall(pattern)[0]
+    if m.empty: return np.empty(0, dtype=np.intp), np.empty(0)
+    return m.index.get_level_values(0).to_numpy(np.intp), m.to_numpy(dtype=float)
+
+def _max_rate(n, pos, vals, limit):
+    out = np.zeros(n)
+    keep = vals <= limit
+    np.maximum.at(out, pos[keep], vals[keep])
+    return out
+
+def extract_rates(texts, percent=False):
+    """
+    Ráta kinyerése szabad szövegből, vektorizáltan (hiányzó érték / nincs találat -> 0.0).
+    percent=False: a legnagyobb szám, ami legfeljebb 50 (az évszámok így kiesnek).
+    percent=True: a legnagyobb, legfeljebb 100-as "N %" érték; ha nincs ilyen minta, a "rate of/is N" alak.
+    """
+    texts = pd.Series(texts)
+    valid = texts.notna().to_numpy()
+    text = texts[valid].astype(str).str.replace(',', '.', regex=False).reset_index(drop=True)
+    n = len(text)
+    if not percent:
+        rates = _max_rate(n, *_rate_matches(text, _RATE_NUMBER), 50.0)
+    else:
+        pos, vals = _rate_matches(text, _RATE_PERCENT)
+        rates = _max_rate(n, pos, vals, 100.0)
+        fallback = np.ones(n, dtype=bool)
+        fallback[pos] = False
+        if fallback.any():
+            fb_pos, fb_vals = _rate_matches(text[fallback].reset_index(drop=True), _RATE_PHRASE)
+            rates[fallback] = _max_rate(int(fallback.sum()), fb_pos, fb_vals, 100.0)
+    out = np.zeros(len(texts))
+    out[valid] = rates
+    return pd.Series(out, index=texts.index)
 
 def create_download_link(df, title="Download Data"):
     if df is None or df.empty: return ""
@@ -1,18 +1,24 @@
 import plotly.express as px
 import plotly.graph_objects as go
 from pathlib import Path
+from report_cache import fingerprint
 from utils import SuppressOutput
 
 class Visualizer:
-    def __init__(self, figures_dir: Path):
+    def __init__(self, figures_dir: Path, cache=None):
         self.figures_dir = figures_dir
         self.figures_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = cache
 
     def _save(self, fig, name):
         path = self.figures_dir / name
+        # Változatlan bemenetek és ábra-specifikáció mellett a korábbi PNG marad (a Kaleido export a drága lépés)
+        output, extra = f"plot:{Path(name).stem}", (fingerprint(fig.to_json()),)
+        if self.cache is not None and self.cache.fresh_file(output, path, extra): return path
         try:
             with SuppressOutput():
                 fig.write_image(path, scale=2, engine="kaleido")
+            if self.cache is not None: self.cache.store(output, str(path), extra)
             return path
         except Exception: return None
 
@@ -25,7 +31,8 @@ class Visualizer:
         # 1. CCyB Diffusion
         df_trend = data.get('agg_trend_df')
         if df_trend is not None and not df_trend.empty:
-            fig = px.line(df_trend, x='date', y='n_positive', title='Number of Countries with Positive CCyB', template='plotly_white')
+            # A trend táblák lépcsős (csak változási pontos) formátumúak: 'hv' vonal
+            fig = px.line(df_trend, x='date', y='n_positive', title='Number of Countries with Positive CCyB', template='plotly_white', line_shape='hv')
             fig.update_layout(xaxis_title="", yaxis_title="Count")
             plot_figs['ccyb_diffusion'] = fig
             download_data['ccyb_diffusion'] = df_trend
@@ -81,9 +88,9 @@ class Visualizer:
         if df_syrb_trend is not None and not df_syrb_trend.empty:
             fig = go.Figure()
             if 'General SyRB' in df_syrb_trend.columns: 
-                fig.add_trace(go.Scatter(x=df_syrb_trend['date'], y=df_syrb_trend['General SyRB'], name='General'))
+                fig.add_trace(go.Scatter(x=df_syrb_trend['date'], y=df_syrb_trend['General SyRB'], name='General', line_shape='hv'))
             if 'Sectoral SyRB' in df_syrb_trend.columns: 
-                fig.add_trace(go.Scatter(x=df_syrb_trend['date'], y=df_syrb_trend['Sectoral SyRB'], name='Sectoral'))
+                fig.add_trace(go.Scatter(x=df_syrb_trend['date'], y=df_syrb_trend['Sectoral SyRB'], name='Sectoral', line_shape='hv'))
             fig.update_layout(title='Active SyRB Measures Count', template='plotly_white', legend=dict(orientation="h", y=-0.2))
             plot_figs['syrb_counts_trend'] = fig
             if p := self._save(fig, "syrb_counts_trend.png"): paths['syrb_counts_trend'] = p
@@ -93,7 +100,7 @@ class Visualizer:
         # 5. SyRB Sectoral (Clustered Bar)
         df_syrb = data.get('latest_syrb_df')
         if df_syrb is not None and not df_syrb.empty:
-            active = df_syrb[df_syrb['rate_numeric'] > 0].copy()
+            active = df_syrb[df_syrb['rate_numeric'] > 0]
             if not active.empty:
                 color_map = {"General": "#3498db", "Real Estate (CRE & RRE)": "#9b59b6", "Residential Real Estate (RRE)": "#2ecc71", "Commercial Real Estate (CRE)": "#e74c3c", "Other": "#95a5a6"}
                 # Használjuk az ETL által tisztított 'exposure_type' kategóriákat
@@ -117,7 +124,7 @@ class Visualizer:
         # 6. BBM Diffusion
         df_bbm_trend = data.get('bbm_trend_df')
         if df_bbm_trend is not None and not df_bbm_trend.empty:
-            fig = px.line(df_bbm_trend, x='date', y='n_countries', title='Number of Countries with at least one Active BBM', template='plotly_white')
+            fig = px.line(df_bbm_trend, x='date', y='n_countries', title='Number of Countries with at least one Active BBM', template='plotly_white', line_shape='hv')
             fig.update_layout(xaxis_title="", yaxis_title="Count")
             plot_figs['bbm_diffusion'] = fig
             download_data['bbm_diffusion'] = df_bbm_trend
@@ -0,0 +1,164 @@
+import hashlib
+import importlib.util
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from utils import clean_columns, file_sha256, find_header_row
+
+logger = logging.getLogger(__name__)
+
+# Növeld, ha a lapbeolvasás (fejléckeresés, oszlopnév-tisztítás) változik: érvényteleníti a cache-t
+PARSER_VERSION = 2
+
+EXCEL_ENGINES = ("calamine", "openpyxl")
+_OOXML_ESCAPE = re.compile(r"_x([0-9A-Fa-f]{4})_")
+
+
+def resolve_engine(engine: str = "auto") -> str:
+    """'auto' esetén calamine (ha telepítve van), különben openpyxl (a pandas read-only módban nyitja meg)."""
+    if engine == "auto":
+        return "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(f"Unknown Excel engine: {engine} (choose from auto, {', '.join(EXCEL_ENGINES)})")
+    if engine == "calamine" and not importlib.util.find_spec("python_calamine"):
+        logger.warning("python-calamine is not installed, falling back to openpyxl.")
+        return "openpyxl"
+    return engine
+
+
+def _normalize_text(value):
+    # Az engine-ek eltérően adják vissza a szöveges cellákat: openpyxl nem oldja fel a _x000D_
+    # jellegű OOXML escape-eket, a calamine viszont igen, és levágja a széleken lévő whitespace-t.
+    # Egységes alak: feloldott escape-ek, \n sorvégek, levágott szélek (üres cella -> NaN).
+    if not isinstance(value, str): return value
+    if "_x" in value:
+        value = _OOXML_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), value)
+    if "\r" in value:
+        value = value.replace("\r\n", "\n").replace("\r", "\n")
+    return value.strip()
+
+SheetMatch = Union[int, str, Callable[[str], bool]]
+
+
+@dataclass
+class SheetProcessor:
+    name: str
+    match: SheetMatch
+    header_keywords: Sequence[str] = ("Country",)
+    header_rows: int = 20
+    process: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+
+
+class WorkbookReader:
+    """
+    Egy ESRB munkafüzet egyszeri megnyitása és laponként egyetlen parse.
+    A fejléc sort a már beolvasott nyers lapból keressük (nincs külön előnézeti parse),
+    majd a regisztrált feldolgozók a tisztított oszlopnevű DataFrame-et kapják.
+    Az engine ("auto", "calamine", "openpyxl") csak a sebességet befolyásolja, a kimenet azonos.
+    Ha cache_dir meg van adva, a beolvasott lapokat Parquetben tároljuk a munkafüzet
+    hash-e és a PARSER_VERSION szerint, és változatlan fájlnál az xlsx-et meg sem nyitjuk.
+    """
+
+    def __init__(self, path: Path, cache_dir: Optional[Path] = None, engine: str = "auto"):
+        self.path = Path(path)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.engine = resolve_engine(engine)
+        self._processors: List[SheetProcessor] = []
+        self._xl = None
+        self._sha256 = None
+
+    def register(self, name: str, match: SheetMatch, header_keywords: Sequence[str] = ("Country",),
+                 header_rows: int = 20, process: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None):
+        self._processors.append(SheetProcessor(name, match, tuple(header_keywords), header_rows, process))
+        return self
+
+    def _excel(self):
+        if self._xl is None:
+            self._xl = pd.ExcelFile(self.path, engine=self.engine)
+        return self._xl
+
+    def close(self):
+        if self._xl is not None:
+            self._xl.close()
+            self._xl = None
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self._excel().sheet_names) if self.path.exists() else []
+
+    def find_sheet(self, match: SheetMatch):
+        names = self.sheet_names
+        if isinstance(match, int):
+            return names[match] if -len(names) <= match < len(names) else None
+        if isinstance(match, str):
+            return match if match in names else None
+        return next((s for s in names if match(s)), None)
+
+    def read_sheet(self, sheet, header_keywords: Sequence[str] = ("Country",), header_rows: int = 20) -> pd.DataFrame:
+        raw = self._excel().parse(sheet, header=None)
+        if raw.empty: return pd.DataFrame()
+        raw = raw.map(_normalize_text)
+        header_idx = find_header_row(raw.head(header_rows), header_keywords, max_rows=header_rows)
+        # Ugyanaz a típuskövetkeztetés, mint a skiprows=header_idx parse-nál, de újraolvasás nélkül
+        body = raw.iloc[header_idx:].astype(object)
+        rows = body.where(body.notna(), "").values.tolist()
+        return clean_columns(TextParser(rows, header=0, skip_blank_lines=False).read())
+
+    def _cache_path(self, p: SheetProcessor) -> Path:
+        if self._sha256 is None:
+            self._sha256 = file_sha256(self.path)
+        spec = f"{p.match if not callable(p.match) else p.name}|{'|'.join(p.header_keywords)}|{p.header_rows}"
+        key = hashlib.sha256(f"{self._sha256}|{PARSER_VERSION}|{spec}".encode()).hexdigest()[:16]
+        return self.cache_dir / f"{self.path.stem}.{p.name}.{key}.parquet"
+
+    def _load_cached(self, p: SheetProcessor) -> Optional[pd.DataFrame]:
+        path = self._cache_path(p)
+        if not path.exists(): return None
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Sheet cache read error ({path.name}): {e}")
+            return None
+
+    def _store_cached(self, p: SheetProcessor, df: pd.DataFrame):
+        path = self._cache_path(p)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for stale in self.cache_dir.glob(f"{self.path.stem}.{p.name}.*.parquet"):
+                stale.unlink()
+            df.to_parquet(path)
+        except Exception as e:
+            # pl. vegyes típusú object oszlop: ilyenkor egyszerűen nem cache-elünk
+            logger.warning(f"Sheet cache write skipped ({p.name}): {e}")
+            if path.exists(): path.unlink()
+
+    def read(self) -> Dict[str, pd.DataFrame]:
+        frames = {p.name: pd.DataFrame() for p in self._processors}
+        if not self.path.exists(): return frames
+        for p in self._processors:
+            if self.cache_dir is not None:
+                cached = self._load_cached(p)
+                if cached is not None:
+                    frames[p.name] = cached
+                    continue
+            try:
+                sheet = self.find_sheet(p.match)
+                if sheet is None:
+                    logger.warning(f"No sheet matched '{p.name}' in {self.path.name}")
+                    continue
+                frames[p.name] = self.read_sheet(sheet, p.header_keywords, p.header_rows)
+                if self.cache_dir is not None: self._store_cached(p, frames[p.name])
+            except Exception as e:
+                logger.error(f"Sheet read error ({p.name}): {e}")
+        return frames
+
+    def process(self) -> Dict[str, pd.DataFrame]:
+        frames = self.read()
+        self.close()
+        return {p.name: p.process(frames[p.name]) if p.process else frames[p.name] for p in self._processors}